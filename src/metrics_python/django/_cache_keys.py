@@ -0,0 +1,82 @@
+import functools
+import threading
+from typing import Any, Callable
+
+from django.utils.module_loading import import_string
+
+from .conf import settings
+
+# Prefix of keys without a separator.
+NO_PREFIX = "<none>"
+
+# Prefix of keys seen after the maximum number of prefixes is reached.
+OTHER_PREFIX = "other"
+
+# Prefix of keys the extractor failed on.
+UNKNOWN_PREFIX = "unknown"
+
+
+def get_key_prefix(key: Any) -> str:
+    """
+    The default key prefix extractor, the part of the key before the first
+    colon.
+    """
+
+    prefix, separator, _ = str(key).partition(":")
+    if not separator:
+        return NO_PREFIX
+
+    return prefix
+
+
+class KeyPrefixes:
+    """
+    Extract the prefix of cache keys, used as a metric label. The number of
+    distinct prefixes is bounded, prefixes seen after max_count prefixes
+    are folded into "other". Keys the extractor raises on are observed as
+    "unknown", a failing extractor never fails the cache call.
+    """
+
+    def __init__(self, extractor: Callable[[Any], str], max_count: int) -> None:
+        self.extractor = extractor
+        self.max_count = max_count
+
+        self._lock = threading.Lock()
+        self._prefixes: set[str] = set()
+
+    def get(self, key: Any) -> str:
+        try:
+            prefix = self.extractor(key)
+        except Exception:
+            return UNKNOWN_PREFIX
+
+        if prefix in self._prefixes:
+            return prefix
+
+        with self._lock:
+            if len(self._prefixes) < self.max_count:
+                self._prefixes.add(prefix)
+                return prefix
+
+        return OTHER_PREFIX
+
+
+@functools.cache
+def _create_key_prefixes() -> KeyPrefixes:
+    extractor = settings.CACHE_KEY_PREFIX_EXTRACTOR or get_key_prefix
+    if isinstance(extractor, str):
+        extractor = import_string(extractor)
+
+    return KeyPrefixes(extractor, settings.CACHE_KEY_PREFIX_MAX_COUNT)
+
+
+def get_key_prefixes() -> KeyPrefixes | None:
+    """
+    Return the key prefixes shared by all caches, None when cache metrics
+    by key prefix are not observed.
+    """
+
+    if not settings.OBSERVE_CACHE_KEY_PREFIXES:
+        return None
+
+    return _create_key_prefixes()
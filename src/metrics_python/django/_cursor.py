@@ -0,0 +1,108 @@
+import time
+from typing import Any, Iterator, Sequence
+
+from django.db.backends.utils import CursorDebugWrapper, CursorWrapper
+
+from ._query_counter import _active_counter
+
+# Approximate size of values that are not strings or bytes, like numbers,
+# dates and booleans.
+DEFAULT_VALUE_SIZE = 8
+
+
+def _get_row_size(row: Sequence[Any]) -> int:
+    size = 0
+    for value in row:
+        if value is None:
+            continue
+        if isinstance(value, (str, bytes, bytearray, memoryview)):
+            size += len(value)
+        else:
+            size += DEFAULT_VALUE_SIZE
+
+    return size
+
+
+def _get_rows_size(rows: Sequence[Any]) -> int:
+    """
+    Return the approximate size of a result set in bytes, estimated from
+    the size of the first row. Strings and bytes are counted by their
+    length, other values by a fixed size. Walking every value of large
+    result sets would cost more than fetching them.
+    """
+
+    if not rows:
+        return 0
+
+    return _get_row_size(rows[0]) * len(rows)
+
+
+class FetchMetricsMixin:
+    """
+    Observe the time spent fetching rows from the cursor, the number of
+    rows and their approximate size. Rows are fetched after the query is
+    executed, Django iterates over large querysets with fetchmany, so this
+    is not part of the query duration.
+    """
+
+    cursor: Any
+    db: Any
+
+    def _observe_fetch(self, rows: Sequence[Any], start: int) -> None:
+        counter = _active_counter.get()
+        if counter is None:
+            return
+
+        counter.observe_fetch(
+            alias=self.db.alias,
+            rows=len(rows),
+            duration=time.perf_counter_ns() - start,
+            size=_get_rows_size(rows),
+        )
+
+    def fetchone(self) -> Any:
+        start = time.perf_counter_ns()
+        with self.db.wrap_database_errors:
+            row = self.cursor.fetchone()
+
+        self._observe_fetch([row] if row is not None else [], start)
+        return row
+
+    def fetchmany(self, *args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter_ns()
+        with self.db.wrap_database_errors:
+            rows = self.cursor.fetchmany(*args, **kwargs)
+
+        self._observe_fetch(rows, start)
+        return rows
+
+    def fetchall(self) -> Any:
+        start = time.perf_counter_ns()
+        with self.db.wrap_database_errors:
+            rows = self.cursor.fetchall()
+
+        self._observe_fetch(rows, start)
+        return rows
+
+    def __iter__(self) -> Iterator[Any]:
+        with self.db.wrap_database_errors:
+            rows = iter(self.cursor)
+
+        while True:
+            start = time.perf_counter_ns()
+            with self.db.wrap_database_errors:
+                row = next(rows, None)
+
+            if row is None:
+                return
+
+            self._observe_fetch([row], start)
+            yield row
+
+
+class MetricsCursorWrapper(FetchMetricsMixin, CursorWrapper):  # type: ignore
+    pass
+
+
+class MetricsCursorDebugWrapper(FetchMetricsMixin, CursorDebugWrapper):  # type: ignore
+    pass
@@ -0,0 +1,87 @@
+import collections
+import threading
+import time
+from contextvars import ContextVar, Token
+
+# Components a request spends time in. Time not spent in any of the other
+# components is attributed to "other".
+COMPONENTS = ("middleware", "view", "db", "cache", "signals", "other")
+
+
+class LatencyBreakdown:
+    """
+    Exclusive time spent in each component during a request. Components
+    are nested, the time spent in a nested component, like a database
+    query executed by a view, is subtracted from the enclosing component.
+    """
+
+    def __init__(self) -> None:
+        # Queries executed concurrently in executor threads by async views
+        # are added to the same breakdown.
+        self._lock = threading.Lock()
+        self.durations: dict[str, float] = collections.defaultdict(float)
+
+    def _add(self, frame: "_Frame", duration: float) -> None:
+        with self._lock:
+            self.durations[frame.component] += max(duration - frame.children, 0)
+            if frame.parent is not None:
+                frame.parent.children += duration
+
+
+class _Frame:
+    __slots__ = ("component", "start", "children", "parent", "breakdown")
+
+    def __init__(
+        self,
+        component: str,
+        parent: "_Frame | None",
+        breakdown: LatencyBreakdown,
+    ) -> None:
+        self.component = component
+        self.parent = parent
+        self.breakdown = breakdown
+        # Time spent in nested components.
+        self.children = 0.0
+        self.start = time.perf_counter()
+
+
+_Entered = tuple[_Frame, Token["_Frame | None"]]
+
+# The innermost component the current request is spending time in, None
+# outside of requests observed by the LatencyBreakdownMiddleware.
+_current_frame: ContextVar[_Frame | None] = ContextVar(
+    "metrics_python_latency_frame", default=None
+)
+
+
+def start_request(breakdown: LatencyBreakdown) -> _Entered:
+    """
+    Start the breakdown of a request, time spent in the request and not in
+    any other component is attributed to "other".
+    """
+
+    frame = _Frame("other", None, breakdown)
+    return frame, _current_frame.set(frame)
+
+
+def enter_component(component: str) -> _Entered | None:
+    """
+    Start timing a component. This is a no-op returning None when the
+    latency of the current request is not observed.
+    """
+
+    parent = _current_frame.get()
+    if parent is None:
+        return None
+
+    frame = _Frame(component, parent, parent.breakdown)
+    return frame, _current_frame.set(frame)
+
+
+def exit_component(entered: _Entered | None) -> None:
+    if entered is None:
+        return
+
+    frame, token = entered
+    _current_frame.reset(token)
+    frame.breakdown._add(frame, time.perf_counter() - frame.start)
@@ -2,6 +2,64 @@ from prometheus_client import Counter, Histogram, Summary
 
 from ..constants import NAMESPACE
 
+# Buckets used by histograms counting the number of times a query is
+# executed in a loop.
+LOOP_SIZE_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+# Buckets used by histograms counting the number of keys in bulk cache
+# calls.
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, float("inf"))
+
+# Buckets used by histograms observing ratios.
+RATIO_BUCKETS = (0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1, float("inf"))
+
+# Buckets used by histograms observing the size of cached values, from
+# small values to values of several megabytes.
+PAYLOAD_SIZE_BUCKETS = (
+    100,
+    1_000,
+    10_000,
+    50_000,
+    100_000,
+    500_000,
+    1_000_000,
+    5_000_000,
+    10_000_000,
+    float("inf"),
+)
+
+# Buckets used by histograms observing URL resolution, resolving a view
+# takes microseconds for small URLconfs.
+URL_RESOLVE_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    float("inf"),
+)
+
+# Buckets used by histograms observing the age of database connections,
+# from short lived connections to connections persisted for hours.
+CONNECTION_AGE_BUCKETS = (
+    0.1,
+    1,
+    10,
+    60,
+    300,
+    600,
+    1800,
+    3600,
+    7200,
+    21600,
+    float("inf"),
+)
+
 #
 # Cache
 #
@@ -24,6 +82,174 @@ CACHE_CALL_GETS_DURATION = Histogram(
     subsystem="django",
 )
 
+CACHE_CALL_BATCH_SIZE = Histogram(
+    "cache_call_batch_size",
+    "Number of keys in bulk cache calls by alias and method.",
+    ["alias", "method"],
+    buckets=BATCH_SIZE_BUCKETS,
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+CACHE_CALL_KEYS_REQUESTED_COUNT = Counter(
+    "cache_call_keys_requested_count",
+    "Number of keys requested by bulk cache gets by alias and method.",
+    ["alias", "method"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+CACHE_CALL_KEYS_RETURNED_COUNT = Counter(
+    "cache_call_keys_returned_count",
+    "Number of keys returned by bulk cache gets by alias and method.",
+    ["alias", "method"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+CACHE_CALL_HIT_RATIO = Histogram(
+    "cache_call_hit_ratio",
+    "Ratio of the requested keys returned by bulk cache gets.",
+    ["alias", "method"],
+    buckets=RATIO_BUCKETS,
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+CACHE_CALL_PAYLOAD_SIZE = Histogram(
+    "cache_call_payload_size",
+    "Size of values stored and retrieved by cache calls by alias and method.",
+    ["alias", "method"],
+    buckets=PAYLOAD_SIZE_BUCKETS,
+    unit="bytes",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+CACHE_CALL_SERIALIZATION_DURATION = Histogram(
+    "cache_call_serialization_duration",
+    "Time cache calls spend serializing and deserializing values.",
+    ["alias", "method"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+CACHE_CALL_EXECUTOR_WAIT_DURATION = Histogram(
+    "cache_call_executor_wait_duration",
+    "Time async cache calls spend waiting for the executor by alias and method.",
+    ["alias", "method"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+CACHE_KEY_PREFIX_CALL_DURATION = Histogram(
+    "cache_key_prefix_call_duration",
+    "Cache call duration by key prefix, alias and method.",
+    ["alias", "method", "prefix"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+CACHE_KEY_PREFIX_GETS_COUNT = Counter(
+    "cache_key_prefix_gets_count",
+    "Number of keys read from the cache by key prefix and cache hit.",
+    ["alias", "method", "prefix", "hit"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+CACHE_KEY_PREFIX_PAYLOAD_SIZE = Histogram(
+    "cache_key_prefix_payload_size",
+    "Size of values stored and retrieved by key prefix, alias and method.",
+    ["alias", "method", "prefix"],
+    buckets=PAYLOAD_SIZE_BUCKETS,
+    unit="bytes",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+#
+# Database queries
+#
+
+QUERY_DURATION = Histogram(
+    "query_duration",
+    "Database query duration.",
+    ["db"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+#
+# URL resolution
+#
+
+URL_RESOLVE_DURATION = Histogram(
+    "url_resolve_duration",
+    "Time spent resolving the view of requests.",
+    ["view"],
+    buckets=URL_RESOLVE_BUCKETS,
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+#
+# Django view latency breakdown
+#
+
+VIEW_COMPONENT_DURATION = Histogram(
+    "view_component_duration",
+    "Time spent in requests by view and component.",
+    ["method", "view", "status", "component"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+#
+# Django streaming responses
+#
+
+VIEW_STREAM_TIME_TO_FIRST_BYTE = Histogram(
+    "view_stream_time_to_first_byte",
+    "Time until the first chunk of streaming responses is produced by views.",
+    ["method", "view", "status"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+VIEW_STREAM_DURATION = Histogram(
+    "view_stream_duration",
+    "Time until streaming responses are sent by views.",
+    ["method", "view", "status"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+VIEW_STREAM_SIZE = Counter(
+    "view_stream_size",
+    "Number of bytes sent by streaming responses.",
+    ["method", "view", "status"],
+    unit="bytes",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+VIEW_STREAM_QUERY_COUNT = Counter(
+    "view_stream_query_count",
+    "Number of database queries executed while streaming responses.",
+    ["db", "method", "view", "status"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
 #
 # Django view query counts
 #
@@ -63,6 +289,101 @@ VIEW_DUPLICATE_QUERY_COUNT = Counter(
     subsystem="django",
 )
 
+VIEW_QUERY_FETCH_DURATION = Histogram(
+    "view_query_fetch_duration",
+    "Time spent fetching query results by views.",
+    ["db", "method", "view", "status"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+VIEW_QUERY_ROW_COUNT = Counter(
+    "view_query_row_count",
+    "Number of rows fetched by views.",
+    ["db", "method", "view", "status"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+VIEW_QUERY_RESULT_SIZE = Counter(
+    "view_query_result_size",
+    "Approximate size of the query results fetched by views.",
+    ["db", "method", "view", "status"],
+    unit="bytes",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+VIEW_N_PLUS_ONE_QUERY_COUNT = Counter(
+    "view_n_plus_one_query_count",
+    "Number of N+1 query patterns detected in views.",
+    ["db", "method", "view", "status"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+VIEW_N_PLUS_ONE_QUERY_LOOP_SIZE = Histogram(
+    "view_n_plus_one_query_loop_size",
+    "Number of times a N+1 query is executed by views.",
+    ["db", "method", "view", "status"],
+    buckets=LOOP_SIZE_BUCKETS,
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+VIEW_TABLE_QUERY_COUNT = Counter(
+    "view_table_query_count",
+    "Number of database queries by views, table and kind.",
+    ["db", "method", "view", "status", "table", "kind"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+VIEW_TABLE_QUERY_DURATION = Counter(
+    "view_table_query_duration",
+    "Database query duration by views, table and kind.",
+    ["db", "method", "view", "status", "table", "kind"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+VIEW_TRANSACTION_COUNT = Counter(
+    "view_transaction_count",
+    "Number of transactions and savepoints by views.",
+    ["db", "method", "view", "status", "kind", "outcome"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+VIEW_TRANSACTION_DURATION = Histogram(
+    "view_transaction_duration",
+    "Time spent in transactions and savepoints per request by views.",
+    ["db", "method", "view", "status", "kind"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+VIEW_TRANSACTION_MAX_DURATION = Histogram(
+    "view_transaction_max_duration",
+    "Duration of the longest transaction or savepoint per request by views.",
+    ["db", "method", "view", "status", "kind"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+VIEW_TRANSACTION_IDLE_DURATION = Histogram(
+    "view_transaction_idle_duration",
+    "Time spent idle in transactions per request by views.",
+    ["db", "method", "view", "status"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
 
 #
 # Django management command query counts
@@ -103,6 +424,101 @@ MANAGEMENT_COMMAND_DUPLICATE_QUERY_COUNT = Counter(
     subsystem="django",
 )
 
+MANAGEMENT_COMMAND_QUERY_FETCH_DURATION = Histogram(
+    "management_command_query_fetch_duration",
+    "Time spent fetching query results by management commands.",
+    ["db", "command"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+MANAGEMENT_COMMAND_QUERY_ROW_COUNT = Counter(
+    "management_command_query_row_count",
+    "Number of rows fetched by management commands.",
+    ["db", "command"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+MANAGEMENT_COMMAND_QUERY_RESULT_SIZE = Counter(
+    "management_command_query_result_size",
+    "Approximate size of the query results fetched by management commands.",
+    ["db", "command"],
+    unit="bytes",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+MANAGEMENT_COMMAND_N_PLUS_ONE_QUERY_COUNT = Counter(
+    "management_command_n_plus_one_query_count",
+    "Number of N+1 query patterns detected in management commands.",
+    ["db", "command"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+MANAGEMENT_COMMAND_N_PLUS_ONE_QUERY_LOOP_SIZE = Histogram(
+    "management_command_n_plus_one_query_loop_size",
+    "Number of times a N+1 query is executed by management commands.",
+    ["db", "command"],
+    buckets=LOOP_SIZE_BUCKETS,
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+MANAGEMENT_COMMAND_TABLE_QUERY_COUNT = Counter(
+    "management_command_table_query_count",
+    "Number of database queries by management commands, table and kind.",
+    ["db", "command", "table", "kind"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+MANAGEMENT_COMMAND_TABLE_QUERY_DURATION = Counter(
+    "management_command_table_query_duration",
+    "Database query duration by management commands, table and kind.",
+    ["db", "command", "table", "kind"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+MANAGEMENT_COMMAND_TRANSACTION_COUNT = Counter(
+    "management_command_transaction_count",
+    "Number of transactions and savepoints by management commands.",
+    ["db", "command", "kind", "outcome"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+MANAGEMENT_COMMAND_TRANSACTION_DURATION = Histogram(
+    "management_command_transaction_duration",
+    "Time spent in transactions and savepoints per command by management commands.",
+    ["db", "command", "kind"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+MANAGEMENT_COMMAND_TRANSACTION_MAX_DURATION = Histogram(
+    "management_command_transaction_max_duration",
+    "Duration of the longest transaction or savepoint per command by management commands.",
+    ["db", "command", "kind"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+MANAGEMENT_COMMAND_TRANSACTION_IDLE_DURATION = Histogram(
+    "management_command_transaction_idle_duration",
+    "Time spent idle in transactions per command by management commands.",
+    ["db", "command"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
 #
 # Django Celery task query counts
 #
@@ -142,6 +558,101 @@ CELERY_DUPLICATE_QUERY_COUNT = Counter(
     subsystem="django",
 )
 
+CELERY_QUERY_FETCH_DURATION = Histogram(
+    "celery_query_fetch_duration",
+    "Time spent fetching query results by celery tasks.",
+    ["db", "task"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+CELERY_QUERY_ROW_COUNT = Counter(
+    "celery_query_row_count",
+    "Number of rows fetched by celery tasks.",
+    ["db", "task"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+CELERY_QUERY_RESULT_SIZE = Counter(
+    "celery_query_result_size",
+    "Approximate size of the query results fetched by celery tasks.",
+    ["db", "task"],
+    unit="bytes",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+CELERY_N_PLUS_ONE_QUERY_COUNT = Counter(
+    "celery_n_plus_one_query_count",
+    "Number of N+1 query patterns detected in celery tasks.",
+    ["db", "task"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+CELERY_N_PLUS_ONE_QUERY_LOOP_SIZE = Histogram(
+    "celery_n_plus_one_query_loop_size",
+    "Number of times a N+1 query is executed by celery tasks.",
+    ["db", "task"],
+    buckets=LOOP_SIZE_BUCKETS,
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+CELERY_TABLE_QUERY_COUNT = Counter(
+    "celery_table_query_count",
+    "Number of database queries by celery tasks, table and kind.",
+    ["db", "task", "table", "kind"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+CELERY_TABLE_QUERY_DURATION = Counter(
+    "celery_table_query_duration",
+    "Database query duration by celery tasks, table and kind.",
+    ["db", "task", "table", "kind"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+CELERY_TRANSACTION_COUNT = Counter(
+    "celery_transaction_count",
+    "Number of transactions and savepoints by celery tasks.",
+    ["db", "task", "kind", "outcome"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+CELERY_TRANSACTION_DURATION = Histogram(
+    "celery_transaction_duration",
+    "Time spent in transactions and savepoints per task by celery tasks.",
+    ["db", "task", "kind"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+CELERY_TRANSACTION_MAX_DURATION = Histogram(
+    "celery_transaction_max_duration",
+    "Duration of the longest transaction or savepoint per task by celery tasks.",
+    ["db", "task", "kind"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+CELERY_TRANSACTION_IDLE_DURATION = Histogram(
+    "celery_transaction_idle_duration",
+    "Time spent idle in transactions per task by celery tasks.",
+    ["db", "task"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
 #
 # Postgres database connection
 #
@@ -162,6 +673,67 @@ DATABASE_INIT_CONNECTION_STATE_HISTOGRAM = Histogram(
     subsystem="django",
 )
 
+DATABASE_POOL_CHECKOUT_DURATION = Histogram(
+    "database_pool_checkout_duration",
+    "Time spent waiting for a connection from the connection pool.",
+    ["db"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+DATABASE_POOL_CHECKOUT_TIMEOUT_COUNT = Counter(
+    "database_pool_checkout_timeout_count",
+    "Number of timeouts waiting for a connection from the connection pool.",
+    ["db"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+DATABASE_CONNECTION_REUSE_COUNT = Counter(
+    "database_connection_reuse_count",
+    "Number of times a connection is used between request boundaries, by "
+    "whether an already open connection was reused.",
+    ["db", "reused"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+DATABASE_HEALTH_CHECK_DURATION = Histogram(
+    "database_health_check_duration",
+    "Time it takes to check if a connection is usable.",
+    ["db"],
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+DATABASE_HEALTH_CHECK_FAILURE_COUNT = Counter(
+    "database_health_check_failure_count",
+    "Number of connections found to be unusable by a health check.",
+    ["db"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+DATABASE_FORCED_RECONNECT_COUNT = Counter(
+    "database_forced_reconnect_count",
+    "Number of connections closed because they failed a health check.",
+    ["db"],
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
+DATABASE_CONNECTION_AGE = Histogram(
+    "database_connection_age",
+    "Age of database connections when they are closed.",
+    ["db"],
+    buckets=CONNECTION_AGE_BUCKETS,
+    unit="seconds",
+    namespace=NAMESPACE,
+    subsystem="django",
+)
+
 
 #
 # Signals
@@ -1,71 +1,408 @@
 import collections
 import contextlib
+import random
+import sys
+import threading
 import time
 import traceback
+from contextvars import ContextVar
+from functools import wraps
 from logging import getLogger
-from types import FrameType
-from typing import Any, Generator
+from types import CodeType, FrameType
+from typing import TYPE_CHECKING, Any, Callable, Generator
 
-from django.db import connections
 from django.template import Node
 
+from ._latency import enter_component, exit_component
+from ._metrics import QUERY_DURATION
+from ._sql import SQLStatement, get_sql_statement
 from .conf import settings
+from .slow_queries import explain_query
+from .statements import TOP_STATEMENTS
+
+if TYPE_CHECKING:
+    from django.db.backends.utils import CursorWrapper
 
 logger = getLogger(__name__)
 
 
+# A frame in a call site is identified by its code object and line
+# number. Frames rendering a template node also carry the template name,
+# template line number and the contents of the template tag.
+TemplateLocation = tuple[str, int, str]
+CallSiteFrame = tuple[CodeType, int, TemplateLocation | None]
+
+# A call site is the stack of frames that executed a query. Unlike
+# traceback.StackSummary this is hashable and cheap to build, it does not
+# read any source lines and it does not keep references to the frames (and
+# the locals in them).
+CallSite = tuple[CallSiteFrame, ...]
+
+# Prometheus limits the combined length of exemplar label names and values.
+EXEMPLAR_MAX_LENGTH = 128
+MAX_TRACE_ID_LENGTH = 40
+
+# Every template node is rendered through Node.render_annotated, frames
+# executing this code object are the only ones where we look at the locals
+# to find the template node.
+_RENDER_ANNOTATED_CODE = Node.render_annotated.__code__
+
+
+# The query counter observing queries in the current context. Queries are
+# routed to the active counter by a process-wide patch of CursorWrapper.
+# ContextVars follow the request when asgiref moves work between threads.
+_active_counter: ContextVar["QueryCounter | None"] = ContextVar(
+    "metrics_python_active_query_counter", default=None
+)
+
+
 def yellow(text: str) -> str:
     return f"\033[33m{text}\033[0m"
 
 
+def _get_params_hash(params: Any) -> int:
+    try:
+        if isinstance(params, dict):
+            return hash(tuple(params.items()))
+        if isinstance(params, list):
+            return hash(tuple(params))
+        return hash(params)
+    except TypeError:
+        # Parameters containing unhashable values, like lists passed to
+        # array fields or the parameter lists used by executemany.
+        return hash(repr(params))
+
+
+def _get_template_location(frame: FrameType) -> TemplateLocation | None:
+    node = frame.f_locals.get("self")
+    token = getattr(node, "token", None)
+    origin = getattr(node, "origin", None)
+
+    if token is None or origin is None:
+        return None
+
+    return (origin.name, token.lineno, token.contents)
+
+
+def _get_call_site(frame: FrameType | None) -> CallSite:
+    call_site: list[CallSiteFrame] = []
+
+    while frame is not None:
+        code = frame.f_code
+        template = None
+        if code is _RENDER_ANNOTATED_CODE:
+            template = _get_template_location(frame)
+
+        call_site.append((code, frame.f_lineno, template))
+        frame = frame.f_back
+
+    call_site.reverse()
+
+    return tuple(call_site)
+
+
+# Serializes patching the cursor wrapper, counters created by concurrent
+# first requests would otherwise wrap it twice.
+_patch_lock = threading.Lock()
+
+
+def _patch_cursor_wrapper() -> None:
+    """
+    Route queries executed by any database connection to the active query
+    counter, and time them as the db component of the latency breakdown.
+
+    Wrapping CursorWrapper on the class, instead of entering an execute
+    wrapper on every connection, covers connections that are created
+    before the query counter is used and connections living in other
+    threads, like the executor threads used by sync_to_async in async
+    views.
+    """
+
+    from django.db.backends.utils import CursorWrapper
+
+    if "_metrics_python_is_patched" in CursorWrapper.__dict__:
+        return
+
+    with _patch_lock:
+        if "_metrics_python_is_patched" not in CursorWrapper.__dict__:
+            _wrap_cursor_wrapper(CursorWrapper)
+
+
+def _wrap_cursor_wrapper(cursor_wrapper: type["CursorWrapper"]) -> None:
+    original_execute_with_wrappers = cursor_wrapper._execute_with_wrappers
+
+    @wraps(original_execute_with_wrappers)
+    def _execute_with_wrappers(
+        self: "CursorWrapper", sql: Any, params: Any, many: Any, executor: Any
+    ) -> Any:
+        entered = enter_component("db")
+        try:
+            counter = _active_counter.get()
+            if counter is None:
+                return original_execute_with_wrappers(self, sql, params, many, executor)
+
+            def execute(sql: Any, params: Any, many: Any, context: Any) -> Any:
+                return original_execute_with_wrappers(self, sql, params, many, executor)
+
+            return counter(
+                execute, sql, params, many, {"connection": self.db, "cursor": self}
+            )
+        finally:
+            exit_component(entered)
+
+    cursor_wrapper._execute_with_wrappers = _execute_with_wrappers
+    cursor_wrapper._metrics_python_is_patched = True
+
+
+def _sample_duplicate_queries(duplicate_queries_sample_rate: float) -> bool:
+    return bool(
+        settings.OBSERVE_DUPLICATE_QUERIES
+        and duplicate_queries_sample_rate > 0
+        and random.random() < duplicate_queries_sample_rate
+    )
+
+
 class QueryCounter:
     """Query counter."""
 
     compress_stacktrace = True
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        *,
+        duplicate_queries_sample_rate: float = 1.0,
+        get_name: Callable[[], str] | None = None,
+        trace_id: str | None = None,
+    ) -> None:
+        # Name of the view, task or command and the trace id of the request,
+        # used to annotate slow queries. The view name is resolved lazily
+        # since it is not known when the counter is created.
+        self.get_name = get_name
+        self.trace_id = trace_id
+
+        # Duplicate queries are observed for a sampled fraction of the
+        # counters, the decision is made when the counter is created.
+        # Query counts and durations are always observed.
+        self.duplicate_queries_sample_rate = duplicate_queries_sample_rate
+        self.observe_duplicate_queries = _sample_duplicate_queries(
+            duplicate_queries_sample_rate
+        )
+        self.max_call_sites = settings.DUPLICATE_QUERIES_MAX_CALL_SITES
+        self.track_statements = settings.TRACK_TOP_STATEMENTS
+        self.observe_query_duration = settings.OBSERVE_QUERY_DURATION
+        self.observe_table_queries = settings.OBSERVE_TABLE_QUERIES
+        self.explain_slow_queries = settings.EXPLAIN_SLOW_QUERIES
+        self.slow_query_threshold_ns = int(settings.SLOW_QUERY_THRESHOLD * 10**9)
+
+        # Whether the statements and duplicate queries are reported by the
+        # owner of the counter instead of when the create_counter context
+        # exits.
+        self.finish_deferred = False
+
+        # The counter that was active when this counter was created, queries
+        # are observed by both counters.
+        self.parent: "QueryCounter | None" = None
+
+        # Async views can execute queries concurrently in multiple executor
+        # threads (sync_to_async with thread_sensitive=False), the counter
+        # follows the request context into all of them.
+        self._lock = threading.Lock()
+
         self.query_count: collections.Counter[str] = collections.Counter()
         self.duration_count: collections.Counter[str] = collections.Counter()
 
-        self.stack_summaries: list[tuple[traceback.StackSummary, str]] = []
-        self.stacks: list[list[tuple[FrameType, int]]] = []
+        # Index of each (call site, sql fingerprint) pair we have seen, used
+        # to look up duplicates in constant time.
+        self.call_sites: dict[tuple[CallSite, str], int] = {}
         self.duplicate_count: collections.Counter[tuple[str, int]] = (
             collections.Counter()
         )
 
+        # Hash of the parameters of the first query from each call site, and
+        # the call sites that executed queries with different parameters.
+        # This is used to detect N+1 queries, like lazy loading of foreign
+        # keys in a loop.
+        self.call_site_params: list[int] = []
+        self.call_sites_with_varying_params: set[int] = set()
+
+        # Count and duration by (alias, sql statement), used to keep track
+        # of the heaviest statements.
+        self.statement_count: collections.Counter[tuple[str, SQLStatement]] = (
+            collections.Counter()
+        )
+        self.statement_duration: collections.Counter[tuple[str, SQLStatement]] = (
+            collections.Counter()
+        )
+
+        # Count and duration by (alias, table, statement kind).
+        self.table_query_count: collections.Counter[tuple[str, str, str]] = (
+            collections.Counter()
+        )
+        self.table_query_duration: collections.Counter[tuple[str, str, str]] = (
+            collections.Counter()
+        )
+
+        # Rows fetched from cursors by alias, with the time spent fetching
+        # them and their approximate size in bytes. Only observed by cursors
+        # created by the metrics-python database engines.
+        self.fetch_duration: collections.Counter[str] = collections.Counter()
+        self.fetch_row_count: collections.Counter[str] = collections.Counter()
+        self.fetch_size: collections.Counter[str] = collections.Counter()
+
+        # Transactions and savepoints observed by patch_transactions, counted
+        # by (alias, kind, outcome). The total and the longest duration are
+        # kept by (alias, kind) and the total idle time by alias, counters of
+        # long running tasks can observe any number of transactions.
+        self.transaction_count: collections.Counter[tuple[str, str, str]] = (
+            collections.Counter()
+        )
+        self.transaction_duration: collections.Counter[tuple[str, str]] = (
+            collections.Counter()
+        )
+        self.transaction_max_duration: dict[tuple[str, str], int] = {}
+        self.transaction_idle_duration: collections.Counter[str] = collections.Counter()
+
     def __call__(
         self, execute: Any, sql: Any, params: Any, many: Any, context: Any
+    ) -> Any:
+        return self._execute(execute, sql, params, many, context, nested=False)
+
+    def _execute(
+        self,
+        execute: Any,
+        sql: Any,
+        params: Any,
+        many: Any,
+        context: Any,
+        *,
+        nested: bool,
     ) -> Any:
         alias = context["connection"].alias
 
-        if settings.OBSERVE_DUPLICATE_QUERIES:
-            stack = list(reversed(list(traceback.walk_stack(None))))
-
-            # StackSummary is used for comparison (have we seen this stack
-            # before?).
-            stack_summary = traceback.StackSummary.extract(stack)
+        statement: SQLStatement | None = None
+        if (
+            self.observe_duplicate_queries
+            or self.track_statements
+            or self.observe_query_duration
+            or self.observe_table_queries
+        ):
+            statement = get_sql_statement(str(sql))
 
-            # If the same SQL came from the same stack trace previously,
-            # it is considered as a duplicate.
-            if (stack_summary, sql) in self.stack_summaries:
-                index = self.stack_summaries.index((stack_summary, sql))
-                # self.duplicates needs to be indexed with a number because
-                # StackSummary is not hashable.
-                self.duplicate_count[(alias, index)] += 1
-            else:
-                self.stack_summaries.append((stack_summary, sql))
+        if statement is not None and self.observe_duplicate_queries:
+            key = (_get_call_site(sys._getframe(1)), statement.fingerprint)
+            params_hash = _get_params_hash(params)
 
-                if settings.PRINT_DUPLICATE_QUERIES:
-                    self.stacks.append(stack)
+            with self._lock:
+                self._observe_call_site(alias, key, params_hash)
 
+        start = time.perf_counter_ns()
         try:
-            start = time.perf_counter_ns()
-            return execute(sql, params, many, context)
+            if self.parent is not None:
+                result = self.parent._execute(
+                    execute, sql, params, many, context, nested=True
+                )
+            else:
+                result = execute(sql, params, many, context)
         finally:
             duration = time.perf_counter_ns() - start
 
-            self.query_count[alias] += 1
-            self.duration_count[alias] += duration
+            with self._lock:
+                self.query_count[alias] += 1
+                self.duration_count[alias] += duration
+
+                if statement is not None and self.track_statements:
+                    self.statement_count[(alias, statement)] += 1
+                    self.statement_duration[(alias, statement)] += duration
+
+                if statement is not None and self.observe_table_queries:
+                    table_key = (alias, statement.table, statement.kind)
+                    self.table_query_count[table_key] += 1
+                    self.table_query_duration[table_key] += duration
+
+        # Queries are observed by every active counter, but the per query
+        # metrics are only observed once, by the innermost counter.
+        if not nested:
+            if statement is not None and self.observe_query_duration:
+                QUERY_DURATION.labels(db=alias).observe(
+                    duration / 10.0**9,
+                    exemplar=self._get_exemplar(statement),
+                )
+
+            if (
+                self.explain_slow_queries
+                and duration >= self.slow_query_threshold_ns
+                and not many
+            ):
+                # The EXPLAIN query should not be observed by the counter.
+                token = _active_counter.set(None)
+                try:
+                    explain_query(
+                        connection=context["connection"],
+                        sql=sql,
+                        params=params,
+                        duration_seconds=duration / 10.0**9,
+                        name=self.get_name() if self.get_name else None,
+                        trace_id=self.trace_id,
+                    )
+                finally:
+                    _active_counter.reset(token)
+
+        return result
+
+    def _get_exemplar(self, statement: SQLStatement) -> dict[str, str]:
+        exemplar = {"statement": statement.fingerprint}
+        if self.trace_id:
+            exemplar["trace_id"] = self.trace_id[:MAX_TRACE_ID_LENGTH]
+
+        if self.get_name:
+            # The view name is truncated to fit the exemplar length limit.
+            used = sum(len(key) + len(value) for key, value in exemplar.items())
+            exemplar["view"] = self.get_name()[: EXEMPLAR_MAX_LENGTH - used - 4]
+
+        return exemplar
+
+    def _observe_call_site(
+        self, alias: str, key: tuple[CallSite, str], params_hash: int
+    ) -> None:
+        # If the same SQL statement came from the same call site
+        # previously, it is considered as a duplicate. Statements only
+        # differing by literals or the length of IN-lists are the same.
+        index = self.call_sites.get(key)
+        if index is not None:
+            self.duplicate_count[(alias, index)] += 1
+
+            if params_hash != self.call_site_params[index]:
+                self.call_sites_with_varying_params.add(index)
+        elif len(self.call_sites) < self.max_call_sites:
+            # The number of call sites we keep track of is bounded to
+            # limit the memory used by requests executing a lot of
+            # distinct queries.
+            self.call_sites[key] = len(self.call_sites)
+            self.call_site_params.append(params_hash)
+
+    def set_duplicate_queries_sample_rate(
+        self, duplicate_queries_sample_rate: float
+    ) -> None:
+        """
+        Change the sample rate of duplicate queries, like when the view of
+        a request is resolved after the counter is created. The sampling
+        decision is made again, the duplicates observed so far are dropped
+        if the counter is no longer sampled.
+        """
+
+        observe_duplicate_queries = _sample_duplicate_queries(
+            duplicate_queries_sample_rate
+        )
+
+        with self._lock:
+            self.duplicate_queries_sample_rate = duplicate_queries_sample_rate
+            self.observe_duplicate_queries = observe_duplicate_queries
+
+            if not observe_duplicate_queries:
+                self.call_sites.clear()
+                self.duplicate_count.clear()
+                self.call_site_params.clear()
+                self.call_sites_with_varying_params.clear()
 
     def get_total_query_count(self) -> int:
         return self.query_count.total()
@@ -81,64 +418,221 @@ class QueryCounter:
             alias: duration / 10.0**9 for alias, duration in self.duration_count.items()
         }
 
+    def get_table_query_count(self) -> dict[tuple[str, str, str], int]:
+        """
+        Return the number of queries by (alias, table, statement kind).
+        """
+
+        return self.table_query_count
+
+    def get_table_query_duration_seconds(self) -> dict[tuple[str, str, str], float]:
+        """
+        Return the query duration by (alias, table, statement kind).
+        """
+
+        return {
+            key: duration / 10.0**9
+            for key, duration in self.table_query_duration.items()
+        }
+
+    def observe_fetch(self, *, alias: str, rows: int, duration: int, size: int) -> None:
+        """
+        Observe rows fetched from a cursor, the duration is in nanoseconds.
+        """
+
+        with self._lock:
+            self.fetch_duration[alias] += duration
+            self.fetch_row_count[alias] += rows
+            self.fetch_size[alias] += size
+
+        if self.parent is not None:
+            self.parent.observe_fetch(
+                alias=alias, rows=rows, duration=duration, size=size
+            )
+
+    def get_total_fetch_duration_seconds_by_alias(self) -> dict[str, float]:
+        return {
+            alias: duration / 10.0**9 for alias, duration in self.fetch_duration.items()
+        }
+
+    def get_total_fetch_row_count_by_alias(self) -> dict[str, int]:
+        return self.fetch_row_count
+
+    def get_total_fetch_size_by_alias(self) -> dict[str, int]:
+        return self.fetch_size
+
+    def observe_transaction(
+        self,
+        *,
+        alias: str,
+        kind: str,
+        outcome: str,
+        duration: int,
+        idle: int | None,
+    ) -> None:
+        """
+        Observe a transaction or savepoint, durations are in nanoseconds.
+        Like queries, transactions are observed by every active counter.
+        """
+
+        with self._lock:
+            self.transaction_count[(alias, kind, outcome)] += 1
+            self.transaction_duration[(alias, kind)] += duration
+            self.transaction_max_duration[(alias, kind)] = max(
+                duration, self.transaction_max_duration.get((alias, kind), 0)
+            )
+            if idle is not None:
+                self.transaction_idle_duration[alias] += idle
+
+        if self.parent is not None:
+            self.parent.observe_transaction(
+                alias=alias, kind=kind, outcome=outcome, duration=duration, idle=idle
+            )
+
+    def get_transaction_count(self) -> dict[tuple[str, str, str], int]:
+        """
+        Return the number of transactions by (alias, kind, outcome).
+        """
+
+        return self.transaction_count
+
+    def get_transaction_duration_seconds(self) -> dict[tuple[str, str], float]:
+        """
+        Return the total time spent in transactions by (alias, kind).
+        """
+
+        return {
+            key: duration / 10.0**9
+            for key, duration in self.transaction_duration.items()
+        }
+
+    def get_transaction_max_duration_seconds(
+        self,
+    ) -> dict[tuple[str, str], float]:
+        """
+        Return the duration of the longest transaction by (alias, kind).
+        """
+
+        return {
+            key: duration / 10.0**9
+            for key, duration in self.transaction_max_duration.items()
+        }
+
+    def get_transaction_idle_duration_seconds(self) -> dict[str, float]:
+        """
+        Return the total time spent idle in transactions by alias.
+        """
+
+        return {
+            alias: duration / 10.0**9
+            for alias, duration in self.transaction_idle_duration.items()
+        }
+
     def get_total_duplicate_query_count(self) -> int:
         return self.duplicate_count.total()
 
     def get_total_duplicate_query_count_by_alias(self) -> dict[str, int]:
-        return {alias: count for (alias, _), count in self.duplicate_count.items()}
+        duplicates: collections.Counter[str] = collections.Counter()
+        for (alias, _), count in self.duplicate_count.items():
+            duplicates[alias] += count
 
-    def print_duplicate_queries(self) -> None:  # noqa: C901
-        if not self.duplicate_count:
-            return
+        return duplicates
 
-        print(yellow("\nDuplicate queries detected!"))
+    def get_estimated_duplicate_query_count_by_alias(self) -> dict[str, float]:
+        """
+        Return the duplicate query count scaled by the sample rate. Summed
+        over many counters this estimates the number of duplicate queries
+        as if every counter observed duplicates.
+        """
 
-        for duplicate, count in self.duplicate_count.items():
-            alias, stack_index = duplicate
-            stack_summary, sql = self.stack_summaries[stack_index]
-            stack_raw = self.stacks[stack_index]
+        if not self.observe_duplicate_queries:
+            return {}
 
-            gap = False
-            for formatted, (frame, _) in zip(stack_summary.format(), stack_raw):
-                filename = frame.f_code.co_filename
-                is_package = "site-packages" in filename
-                f_locals = frame.f_locals
-                is_template_node = "self" in f_locals and isinstance(
-                    f_locals["self"], Node
-                )
+        return {
+            alias: count / self.duplicate_queries_sample_rate
+            for alias, count in self.get_total_duplicate_query_count_by_alias().items()
+        }
 
-                if self.compress_stacktrace and is_package and not is_template_node:
-                    if not gap:
-                        print("  ", end="")
-                    print(".", end="")
-                    gap = True
-                    continue
+    def defer_finish(self) -> None:
+        """
+        Don't finish the counter when the create_counter context exits, like
+        when queries are still executed while a streaming response is
+        consumed. The owner of the counter calls finish() instead.
+        """
+
+        self.finish_deferred = True
+
+    def finish(self) -> None:
+        """
+        Report the statements and duplicate queries of a completed request,
+        task or command.
+        """
+
+        if self.track_statements:
+            self.track_top_statements()
+
+        if settings.PRINT_DUPLICATE_QUERIES:
+            self.print_duplicate_queries()
+
+    def track_top_statements(self) -> None:
+        """
+        Add the statements executed by this counter to the process-wide
+        top statements.
+        """
+
+        for (alias, statement), count in self.statement_count.items():
+            TOP_STATEMENTS.add(
+                db=alias,
+                fingerprint=statement.fingerprint,
+                statement=statement.normalized,
+                count=count,
+                duration_seconds=self.statement_duration[(alias, statement)] / 10.0**9,
+            )
+
+    def get_n_plus_one_loop_sizes_by_alias(self) -> dict[str, list[int]]:
+        """
+        Return the number of executions for each N+1 query pattern. A N+1
+        query is the same SQL statement executed from the same call site
+        more than N_PLUS_ONE_THRESHOLD times, with different parameters.
+        """
+
+        threshold = settings.N_PLUS_ONE_THRESHOLD
+        loop_sizes: dict[str, list[int]] = collections.defaultdict(list)
+
+        for (alias, index), count in self.duplicate_count.items():
+            executions = count + 1
+            if executions > threshold and index in self.call_sites_with_varying_params:
+                loop_sizes[alias].append(executions)
+
+        return loop_sizes
+
+    def get_estimated_n_plus_one_count_by_alias(self) -> dict[str, float]:
+        """
+        Return the number of N+1 query patterns scaled by the sample rate.
+        """
+
+        if not self.observe_duplicate_queries:
+            return {}
 
-                if gap:
-                    print()
+        return {
+            alias: len(loop_sizes) / self.duplicate_queries_sample_rate
+            for alias, loop_sizes in self.get_n_plus_one_loop_sizes_by_alias().items()
+        }
+
+    def print_duplicate_queries(self) -> None:
+        if not self.duplicate_count:
+            return
 
-                if is_template_node:
-                    node = f_locals["self"]
+        print(yellow("\nDuplicate queries detected!"))
 
-                    # There is usually multiple stack frames that process the same template line. For this rendering,
-                    # we just want to show the template stack, so we can ignore any frames that have an identical Node
-                    # as their predecessor.
-                    if frame.f_back:
-                        parent_locals = frame.f_back.f_locals
-                        parent_is_template = "self" in parent_locals and isinstance(
-                            parent_locals["self"], Node
-                        )
-                        if parent_is_template:
-                            parent_node = parent_locals["self"]
-                            if parent_node == node:
-                                continue
+        # The call sites are inserted in the same order as their index.
+        call_sites = list(self.call_sites)
 
-                    print(f'  File "{node.origin.name}", line {node.token.lineno}')
-                    print(f"    {node.token.contents}")
-                else:
-                    print(formatted, end="")
+        for duplicate, count in self.duplicate_count.items():
+            _, index = duplicate
+            call_site, _ = call_sites[index]
 
-                gap = False
+            self._print_call_site(call_site)
 
             print(yellow(f"\n^^ The above query was executed {count + 1} times ^^\n"))
 
@@ -147,18 +641,72 @@ class QueryCounter:
             f"({self.get_total_duplicate_query_count()} executions)"
         )
 
-    @contextlib.contextmanager
-    @staticmethod
-    def create_counter() -> Generator["QueryCounter", None, None]:
-        counter = QueryCounter()
+    def _print_call_site(self, call_site: CallSite) -> None:
+        gap = False
+        previous_template: TemplateLocation | None = None
+
+        for code, lineno, template in call_site:
+            filename = code.co_filename
+            is_package = "site-packages" in filename
+
+            if self.compress_stacktrace and is_package and template is None:
+                if not gap:
+                    print("  ", end="")
+                print(".", end="")
+                gap = True
+                continue
+
+            if gap:
+                print()
+
+            if template is not None:
+                # Nested nodes on the same template line are rendered in
+                # multiple frames. We just want to show the template stack, so
+                # we ignore frames for the same line as their predecessor.
+                if template == previous_template:
+                    continue
+
+                template_name, template_lineno, contents = template
+                print(f'  File "{template_name}", line {template_lineno}')
+                print(f"    {contents}")
 
-        with contextlib.ExitStack() as stack:
-            for alias in connections:
-                stack.enter_context(
-                    connections[alias].execute_wrapper(counter),
+                previous_template = template
+            else:
+                # Source lines are only read when the duplicate queries are
+                # printed, not when the query is executed.
+                frame_summary = traceback.FrameSummary(filename, lineno, code.co_name)
+                print(
+                    "".join(traceback.StackSummary.from_list([frame_summary]).format()),
+                    end="",
                 )
 
+            gap = False
+
+    @contextlib.contextmanager
+    @staticmethod
+    def create_counter(
+        *,
+        duplicate_queries_sample_rate: float | None = None,
+        get_name: Callable[[], str] | None = None,
+        trace_id: str | None = None,
+    ) -> Generator["QueryCounter", None, None]:
+        if duplicate_queries_sample_rate is None:
+            duplicate_queries_sample_rate = settings.DUPLICATE_QUERIES_SAMPLE_RATE
+
+        _patch_cursor_wrapper()
+
+        counter = QueryCounter(
+            duplicate_queries_sample_rate=duplicate_queries_sample_rate,
+            get_name=get_name,
+            trace_id=trace_id,
+        )
+        counter.parent = _active_counter.get()
+
+        token = _active_counter.set(counter)
+        try:
             yield counter
+        finally:
+            _active_counter.reset(token)
 
-            if settings.PRINT_DUPLICATE_QUERIES:
-                counter.print_duplicate_queries()
+        if not counter.finish_deferred:
+            counter.finish()
@@ -0,0 +1,87 @@
+import functools
+import hashlib
+import re
+from typing import NamedTuple
+
+# Number of distinct SQL statements we keep normalized in memory.
+SQL_STATEMENT_CACHE_SIZE = 4096
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%s|%\(\w+\)s|\$\d+|\?")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_LIST_RE = re.compile(r"(\(\?(?:\s*,\s*\?)*\))(?:\s*,\s*\(\?(?:\s*,\s*\?)*\))+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+_IDENTIFIER = r'(?:"[^"]+"|`[^`]+`|[\w$]+)(?:\.(?:"[^"]+"|`[^`]+`|[\w$]+))?'
+_TABLE_RES = {
+    "select": re.compile(rf"\bFROM\s+({_IDENTIFIER})", re.IGNORECASE),
+    "insert": re.compile(rf"^INSERT\s+INTO\s+({_IDENTIFIER})", re.IGNORECASE),
+    "update": re.compile(rf"^UPDATE\s+({_IDENTIFIER})", re.IGNORECASE),
+    "delete": re.compile(rf"^DELETE\s+FROM\s+({_IDENTIFIER})", re.IGNORECASE),
+}
+
+
+class SQLStatement(NamedTuple):
+    # SQL with literals and placeholders replaced by ?, IN-lists and
+    # VALUES-lists collapsed and whitespace folded.
+    normalized: str
+    # Short hash of the normalized SQL.
+    fingerprint: str
+    # Statement kind (select, insert, update, delete or other) and the
+    # primary table of the statement, if it could be found.
+    kind: str
+    table: str
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Normalize a SQL statement, statements that only differ by literals,
+    the number of parameters in IN-lists or whitespace are normalized to
+    the same string.
+    """
+
+    sql = _STRING_RE.sub("?", sql)
+    sql = _PLACEHOLDER_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _WHITESPACE_RE.sub(" ", sql)
+    sql = _IN_LIST_RE.sub("IN (...)", sql)
+    sql = _VALUES_LIST_RE.sub(r"\1, ...", sql)
+
+    return sql.strip()
+
+
+def get_statement_kind_and_table(normalized_sql: str) -> tuple[str, str]:
+    """
+    Return the statement kind and the primary table of a normalized
+    statement. This is a lightweight extraction and not a SQL parser, the
+    primary table of a SELECT is the first table in a FROM clause.
+    """
+
+    kind = normalized_sql.split(" ", 1)[0].lower()
+    table_re = _TABLE_RES.get(kind)
+    if table_re is None:
+        return "other", "<unknown>"
+
+    match = table_re.search(normalized_sql)
+    if match is None:
+        return kind, "<unknown>"
+
+    return kind, match.group(1).replace('"', "").replace("`", "")
+
+
+@functools.lru_cache(maxsize=SQL_STATEMENT_CACHE_SIZE)
+def get_sql_statement(sql: str) -> SQLStatement:
+    """
+    Return the normalized statement, fingerprint, kind and table for a SQL
+    string. The result is cached, an application usually executes a limited
+    set of distinct SQL strings.
+    """
+
+    normalized = normalize_sql(sql)
+    fingerprint = hashlib.blake2b(normalized.encode(), digest_size=8).hexdigest()
+    kind, table = get_statement_kind_and_table(normalized)
+
+    return SQLStatement(
+        normalized=normalized, fingerprint=fingerprint, kind=kind, table=table
+    )
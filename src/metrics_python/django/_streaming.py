@@ -0,0 +1,125 @@
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Iterator
+
+from django.http import StreamingHttpResponse
+
+from ._query_counter import QueryCounter, _active_counter
+
+
+@dataclass
+class StreamStats:
+    # Time from the start of the request until the first chunk was produced,
+    # None when the stream is not iterated by us (file responses served by
+    # wsgi.file_wrapper) or the stream was empty.
+    time_to_first_byte: float | None
+    # Time from the start of the request until the response was closed.
+    duration: float
+    size: int
+
+
+class _StreamState:
+    def __init__(self, start: float) -> None:
+        self.start = start
+        self.first_chunk_at: float | None = None
+        self.size = 0
+        self.closed = False
+
+    def observe_chunk(self, chunk: bytes) -> None:
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.perf_counter()
+
+        self.size += len(chunk)
+
+    def get_stats(self) -> StreamStats:
+        time_to_first_byte = None
+        if self.first_chunk_at is not None:
+            time_to_first_byte = self.first_chunk_at - self.start
+
+        return StreamStats(
+            time_to_first_byte=time_to_first_byte,
+            duration=time.perf_counter() - self.start,
+            size=self.size,
+        )
+
+
+def _iterate(
+    content: Iterator[bytes], state: _StreamState, counter: QueryCounter | None
+) -> Iterator[bytes]:
+    iterator = iter(content)
+
+    while True:
+        # Queries executed while producing the stream are observed by the
+        # query counter of the request.
+        token = _active_counter.set(counter) if counter is not None else None
+        try:
+            chunk = next(iterator, None)
+        finally:
+            if token is not None:
+                _active_counter.reset(token)
+
+        if chunk is None:
+            return
+
+        state.observe_chunk(chunk)
+        yield chunk
+
+
+async def _aiterate(
+    content: AsyncIterator[bytes], state: _StreamState, counter: QueryCounter | None
+) -> AsyncIterator[bytes]:
+    iterator = content.__aiter__()
+
+    while True:
+        token = _active_counter.set(counter) if counter is not None else None
+        try:
+            chunk = await iterator.__anext__()
+        except StopAsyncIteration:
+            return
+        finally:
+            if token is not None:
+                _active_counter.reset(token)
+
+        state.observe_chunk(chunk)
+        yield chunk
+
+
+def wrap_streaming_response(
+    response: StreamingHttpResponse,
+    *,
+    start: float,
+    counter: QueryCounter | None,
+    on_close: Callable[[StreamStats], Any],
+) -> None:
+    """
+    Observe the stream of a streaming response, on_close is called with the
+    stream stats when the server closes the response after sending it.
+    Queries executed while the stream is consumed are routed to counter.
+    """
+
+    state = _StreamState(start)
+
+    if getattr(response, "file_to_stream", None) is not None:
+        # Replacing the content of a file response would prevent the server
+        # from sending the file with wsgi.file_wrapper, only the duration and
+        # the content length are observed.
+        content_length = response.get("Content-Length", "")
+        if content_length.isdigit():
+            state.size = int(content_length)
+    elif getattr(response, "is_async", False):
+        response.streaming_content = _aiterate(
+            response.streaming_content, state, counter
+        )
+    else:
+        response.streaming_content = _iterate(
+            response.streaming_content, state, counter
+        )
+
+    def close() -> None:
+        if state.closed:
+            return
+
+        state.closed = True
+        on_close(state.get_stats())
+
+    response._resource_closers.append(close)
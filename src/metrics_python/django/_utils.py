@@ -26,3 +26,19 @@ def get_view_name(request: HttpRequest) -> str:
                 view_name = request.resolver_match.view_name
 
     return view_name
+
+
+def get_trace_id(request: HttpRequest) -> str | None:
+    """
+    Return the trace id from the W3C traceparent header, or the request id
+    from the X-Request-ID header.
+    """
+
+    traceparent: str | None = request.headers.get("traceparent")
+    if traceparent:
+        parts = traceparent.split("-")
+        if len(parts) >= 2:
+            return parts[1]
+
+    request_id: str | None = request.headers.get("x-request-id")
+    return request_id
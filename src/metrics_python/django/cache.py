@@ -1,8 +1,29 @@
 import functools
+import pickle
 import time
-from typing import TYPE_CHECKING, Any
+from collections.abc import Sized
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, NamedTuple
 
-from ._metrics import CACHE_CALL_DURATION, CACHE_CALL_GETS_DURATION
+from prometheus_client import Counter, Histogram
+
+from ._cache_keys import KeyPrefixes, get_key_prefixes
+from ._latency import enter_component, exit_component
+from ._metrics import (
+    CACHE_CALL_BATCH_SIZE,
+    CACHE_CALL_DURATION,
+    CACHE_CALL_EXECUTOR_WAIT_DURATION,
+    CACHE_CALL_GETS_DURATION,
+    CACHE_CALL_HIT_RATIO,
+    CACHE_CALL_KEYS_REQUESTED_COUNT,
+    CACHE_CALL_KEYS_RETURNED_COUNT,
+    CACHE_CALL_PAYLOAD_SIZE,
+    CACHE_CALL_SERIALIZATION_DURATION,
+    CACHE_KEY_PREFIX_CALL_DURATION,
+    CACHE_KEY_PREFIX_GETS_COUNT,
+    CACHE_KEY_PREFIX_PAYLOAD_SIZE,
+)
+from .conf import settings
 
 if TYPE_CHECKING:
     from django.core.cache import CacheHandler
@@ -20,46 +41,606 @@ METHODS_TO_INSTRUMENT = [
     "touch",
 ]
 
-METHODS_WITH_RETURN_VALUE = ["get", "get_many"]
+# The async methods of the cache API. The default implementation of the
+# async methods in BaseCache runs the sync methods in the executor.
+ASYNC_METHODS_TO_INSTRUMENT = [
+    f"a{method_name}" for method_name in METHODS_TO_INSTRUMENT
+]
+
+METHODS_WITH_RETURN_VALUE = ["get", "get_many", "aget", "aget_many"]
+
+# Methods operating on a batch of keys, the keys or the data to set is the
+# first argument.
+BATCH_METHODS = [
+    "delete_many",
+    "get_many",
+    "set_many",
+    "adelete_many",
+    "aget_many",
+    "aset_many",
+]
+
+# Methods returning a dict of the keys found in the cache.
+BULK_GET_METHODS = ["get_many", "aget_many"]
+
+# Methods storing or retrieving values.
+PAYLOAD_METHODS = [
+    "add",
+    "get",
+    "get_many",
+    "set",
+    "set_many",
+    "aadd",
+    "aget",
+    "aget_many",
+    "aset",
+    "aset_many",
+]
+
+
+class _MethodMetrics(NamedTuple):
+    duration: Histogram
+    # Only set for methods with a return value.
+    hit: Histogram | None
+    miss: Histogram | None
+    # Only set for async methods.
+    executor_wait: Histogram | None
+    # Only set for batch methods.
+    batch_size: Histogram | None
+    # Only set for bulk get methods.
+    keys_requested: Counter | None
+    keys_returned: Counter | None
+    hit_ratio: Histogram | None
+    # Only set for methods storing or retrieving values.
+    payload_size: Histogram | None
+    serialization_duration: Histogram | None
+
+
+class _CacheCall:
+    """
+    The cache call the current context is part of. Cache calls executed by
+    another cache call, like get by the default get_many and the sync
+    methods executed by async methods in the executor, are observed as part
+    of the enclosing call and add their duration to its backend duration.
+    """
+
+    __slots__ = (
+        "backend_duration",
+        "nested_calls",
+        "serializer_calls",
+        "serialization_duration",
+        "payload_size",
+    )
+
+    def __init__(self) -> None:
+        self.backend_duration = 0.0
+        self.nested_calls = 0
+        self.serializer_calls = 0
+        self.serialization_duration = 0.0
+        self.payload_size = 0
+
+    def observe_serializer(self, duration: float, data: Any) -> None:
+        self.serializer_calls += 1
+        self.serialization_duration += duration
+
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            self.payload_size += len(data)
+        elif isinstance(data, int):
+            # Integers are stored as strings.
+            self.payload_size += len(str(data))
+
+
+_active_call: ContextVar[_CacheCall | None] = ContextVar(
+    "metrics_python_cache_active_call", default=None
+)
+
+
+def _create_method_metrics(alias: str, method_name: str) -> _MethodMetrics:
+    labels = {"alias": alias, "method": method_name}
+
+    hit = miss = executor_wait = batch_size = None
+    keys_requested = keys_returned = hit_ratio = None
+    payload_size = serialization_duration = None
+
+    if method_name in METHODS_WITH_RETURN_VALUE:
+        hit = CACHE_CALL_GETS_DURATION.labels(hit=True, **labels)
+        miss = CACHE_CALL_GETS_DURATION.labels(hit=False, **labels)
+
+    if method_name in ASYNC_METHODS_TO_INSTRUMENT:
+        executor_wait = CACHE_CALL_EXECUTOR_WAIT_DURATION.labels(**labels)
+
+    if method_name in BATCH_METHODS:
+        batch_size = CACHE_CALL_BATCH_SIZE.labels(**labels)
+
+    if method_name in BULK_GET_METHODS:
+        keys_requested = CACHE_CALL_KEYS_REQUESTED_COUNT.labels(**labels)
+        keys_returned = CACHE_CALL_KEYS_RETURNED_COUNT.labels(**labels)
+        hit_ratio = CACHE_CALL_HIT_RATIO.labels(**labels)
+
+    if method_name in PAYLOAD_METHODS:
+        payload_size = CACHE_CALL_PAYLOAD_SIZE.labels(**labels)
+        serialization_duration = CACHE_CALL_SERIALIZATION_DURATION.labels(**labels)
+
+    return _MethodMetrics(
+        duration=CACHE_CALL_DURATION.labels(**labels),
+        hit=hit,
+        miss=miss,
+        executor_wait=executor_wait,
+        batch_size=batch_size,
+        keys_requested=keys_requested,
+        keys_returned=keys_returned,
+        hit_ratio=hit_ratio,
+        payload_size=payload_size,
+        serialization_duration=serialization_duration,
+    )
+
+
+def _create_cache_metrics(alias: str) -> dict[str, _MethodMetrics]:
+    """
+    Resolve the label children of the cache metrics once per cache
+    instance, instead of on every call.
+    """
+
+    return {
+        method_name: _create_method_metrics(alias, method_name)
+        for method_name in METHODS_TO_INSTRUMENT + ASYNC_METHODS_TO_INSTRUMENT
+    }
+
+
+def _prepare_batch(
+    args: tuple[Any, ...], kwargs: dict[str, Any]
+) -> tuple[tuple[Any, ...], dict[str, Any], int | None]:
+    """
+    Return the arguments of a batch call and the size of the batch. Keys
+    passed as an iterator are materialized, so they can be counted before
+    the backend consumes them.
+    """
+
+    if args:
+        batch = args[0]
+        if not isinstance(batch, Sized):
+            batch = list(batch)
+            args = (batch, *args[1:])
+
+        return args, kwargs, len(batch)
+
+    for name in ("keys", "data"):
+        if name in kwargs:
+            batch = kwargs[name]
+            if not isinstance(batch, Sized):
+                batch = list(batch)
+                kwargs = {**kwargs, name: batch}
+
+            return args, kwargs, len(batch)
+
+    return args, kwargs, None
+
+
+def _observe_call(
+    metrics: _MethodMetrics, duration: float, value: Any, batch_size: int | None
+) -> None:
+    metrics.duration.observe(duration)
+
+    if metrics.hit is not None and metrics.miss is not None:
+        # Bulk gets return a dict of the keys found, the call is a hit when
+        # any of the keys is found.
+        if value is not None and (metrics.keys_returned is None or value):
+            metrics.hit.observe(duration)
+        else:
+            metrics.miss.observe(duration)
+
+    if batch_size is None:
+        return
+
+    if metrics.batch_size is not None:
+        metrics.batch_size.observe(batch_size)
+
+    if (
+        metrics.keys_requested is not None
+        and metrics.keys_returned is not None
+        and metrics.hit_ratio is not None
+        and isinstance(value, dict)
+    ):
+        metrics.keys_requested.inc(batch_size)
+        metrics.keys_returned.inc(len(value))
+
+        if batch_size:
+            metrics.hit_ratio.observe(len(value) / batch_size)
+
+
+# Marks items of a cache call without a stored or retrieved value.
+_NO_PAYLOAD = object()
+
+
+def _get_payload_size(value: Any) -> int | None:
+    """
+    Return the approximate size of a cached value in bytes, the size of the
+    value when pickled like most cache backends do.
+    """
+
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+
+    try:
+        return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        # Values that can't be pickled, or whose __reduce__ fails, are not
+        # observed.
+        return None
+
+
+def _get_operation(method_name: str) -> str:
+    """
+    Return the name of the sync method of async methods.
+    """
+
+    if method_name in ASYNC_METHODS_TO_INSTRUMENT:
+        return method_name[1:]
+
+    return method_name
+
+
+def _get_batch_items(
+    operation: str, batch: Any, value: Any
+) -> list[tuple[Any, bool | None, Any]]:
+    if operation == "get_many":
+        found = value if isinstance(value, dict) else {}
+        return [(key, key in found, found.get(key, _NO_PAYLOAD)) for key in batch or ()]
 
+    if operation == "set_many":
+        return [(key, None, item) for key, item in (batch or {}).items()]
 
-def _patch_cache_method(cache: "BaseCache", method_name: str, alias: str) -> None:
-    def _instrument_call(
+    return [(key, None, _NO_PAYLOAD) for key in batch or ()]
+
+
+def _get_items(
+    operation: str, args: tuple[Any, ...], kwargs: dict[str, Any], value: Any
+) -> list[tuple[Any, bool | None, Any]]:
+    """
+    Return the keys of a cache call, whether they were found for gets and
+    the value stored or retrieved.
+    """
+
+    if operation in BATCH_METHODS:
+        batch = args[0] if args else kwargs.get("keys", kwargs.get("data"))
+        return _get_batch_items(operation, batch, value)
+
+    key = args[0] if args else kwargs.get("key")
+
+    if operation == "get":
+        hit = value is not None
+        return [(key, hit, value if hit else _NO_PAYLOAD)]
+
+    if operation in ("add", "set"):
+        return [(key, None, args[1] if len(args) > 1 else kwargs.get("value"))]
+
+    return [(key, None, _NO_PAYLOAD)]
+
+
+def _observe_payload(
+    metrics: _MethodMetrics,
+    call: _CacheCall,
+    *,
+    method_name: str,
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+    value: Any,
+    estimate: bool,
+) -> None:
+    if metrics.payload_size is None or metrics.serialization_duration is None:
+        return
+
+    # The size of the values serialized by the backend serializer is known,
+    # so is the time spent serializing them.
+    if call.serializer_calls:
+        metrics.payload_size.observe(call.payload_size)
+        metrics.serialization_duration.observe(call.serialization_duration)
+        return
+
+    if not estimate:
+        return
+
+    sizes = [
+        _get_payload_size(payload) or 0
+        for _, _, payload in _get_items(
+            _get_operation(method_name), args, kwargs, value
+        )
+        if payload is not _NO_PAYLOAD
+    ]
+    if sizes:
+        metrics.payload_size.observe(sum(sizes))
+
+
+class _KeyPrefixMethodMetrics(NamedTuple):
+    duration: Histogram
+    hit: Counter
+    miss: Counter
+    payload_size: Histogram
+
+
+class _KeyPrefixMetrics:
+    """
+    Cache metrics by key prefix of a cache instance. The label children
+    are resolved once per method and prefix.
+    """
+
+    def __init__(self, alias: str, key_prefixes: KeyPrefixes) -> None:
+        self.alias = alias
+        self.key_prefixes = key_prefixes
+
+        self._metrics: dict[tuple[str, str], _KeyPrefixMethodMetrics] = {}
+
+    def _get_metrics(self, method_name: str, prefix: str) -> _KeyPrefixMethodMetrics:
+        metrics = self._metrics.get((method_name, prefix))
+        if metrics is None:
+            labels = {"alias": self.alias, "method": method_name, "prefix": prefix}
+            metrics = _KeyPrefixMethodMetrics(
+                duration=CACHE_KEY_PREFIX_CALL_DURATION.labels(**labels),
+                hit=CACHE_KEY_PREFIX_GETS_COUNT.labels(hit=True, **labels),
+                miss=CACHE_KEY_PREFIX_GETS_COUNT.labels(hit=False, **labels),
+                payload_size=CACHE_KEY_PREFIX_PAYLOAD_SIZE.labels(**labels),
+            )
+            self._metrics[(method_name, prefix)] = metrics
+
+        return metrics
+
+    def observe(
+        self,
+        call: _CacheCall,
+        *,
         method_name: str,
-        alias: str,
-        original_method: Any,
-        args: Any,
-        kwargs: Any,
-    ) -> Any:
-        start = time.perf_counter()
-        value = original_method(*args, **kwargs)
-        duration = time.perf_counter() - start
+        args: tuple[Any, ...],
+        kwargs: dict[str, Any],
+        value: Any,
+        duration: float,
+        estimate: bool,
+    ) -> None:
+        items = _get_items(_get_operation(method_name), args, kwargs, value)
+
+        # The size of the values serialized by the backend serializer is
+        # known for the call, bulk calls attribute the average size to each
+        # value.
+        serialized_size = None
+        if call.serializer_calls:
+            payloads = sum(1 for _, _, payload in items if payload is not _NO_PAYLOAD)
+            serialized_size = call.payload_size / max(payloads, 1)
+
+        # Bulk calls with keys of several prefixes are observed once for
+        # each prefix.
+        observed_prefixes = set()
+
+        for key, hit, payload in items:
+            prefix = self.key_prefixes.get(key)
+            metrics = self._get_metrics(method_name, prefix)
+
+            if prefix not in observed_prefixes:
+                observed_prefixes.add(prefix)
+                metrics.duration.observe(duration)
+
+            if hit is not None:
+                if hit:
+                    metrics.hit.inc()
+                else:
+                    metrics.miss.inc()
+
+            if payload is not _NO_PAYLOAD:
+                # Values are only pickled when payload sizes are estimated.
+                size = serialized_size
+                if size is None and estimate:
+                    size = _get_payload_size(payload)
+
+                if size is not None:
+                    metrics.payload_size.observe(size)
+
+
+def _patch_cache_method(cache_class: type["BaseCache"], method_name: str) -> None:
+    original_method = getattr(cache_class, method_name)
+
+    # The method is inherited from a backend class that is already patched.
+    if hasattr(original_method, "_metrics_python_is_patched"):
+        return
+
+    @functools.wraps(original_method)
+    def patched_method(self: "BaseCache", *args: Any, **kwargs: Any) -> Any:
+        # Only caches created by the cache handler are observed.
+        cache_metrics = getattr(self, "_metrics_python_metrics", None)
+        if cache_metrics is None:
+            return original_method(self, *args, **kwargs)
+
+        active_call = _active_call.get()
+        if active_call is not None:
+            start = time.perf_counter()
+            try:
+                return original_method(self, *args, **kwargs)
+            finally:
+                active_call.backend_duration += time.perf_counter() - start
+                active_call.nested_calls += 1
+
+        metrics = cache_metrics[method_name]
+
+        batch_size = None
+        if metrics.batch_size is not None:
+            args, kwargs, batch_size = _prepare_batch(args, kwargs)
+
+        call = _CacheCall()
+        token = _active_call.set(call)
+        entered = enter_component("cache")
+        try:
+            start = time.perf_counter()
+            value = original_method(self, *args, **kwargs)
+            duration = time.perf_counter() - start
+        finally:
+            exit_component(entered)
+            _active_call.reset(token)
 
-        CACHE_CALL_DURATION.labels(alias=alias, method=method_name).observe(duration)
+        _observe_call(metrics, duration, value, batch_size)
+        _observe_payload(
+            metrics,
+            call,
+            method_name=method_name,
+            args=args,
+            kwargs=kwargs,
+            value=value,
+            estimate=self._metrics_python_estimate_payload_size,
+        )
 
-        if method_name in METHODS_WITH_RETURN_VALUE:
-            cache_hit = value is not None
-            CACHE_CALL_GETS_DURATION.labels(
-                alias=alias, method=method_name, hit=cache_hit
-            ).observe(duration)
+        key_prefix_metrics = self._metrics_python_key_prefix_metrics
+        if key_prefix_metrics is not None:
+            key_prefix_metrics.observe(
+                call,
+                method_name=method_name,
+                args=args,
+                kwargs=kwargs,
+                value=value,
+                duration=duration,
+                estimate=self._metrics_python_estimate_payload_size,
+            )
 
         return value
 
-    original_method = getattr(cache, method_name)
+    patched_method._metrics_python_is_patched = True  # type: ignore
+    setattr(cache_class, method_name, patched_method)
+
+
+def _patch_async_cache_method(cache_class: type["BaseCache"], method_name: str) -> None:
+    original_method = getattr(cache_class, method_name, None)
+
+    # The method is inherited from a backend class that is already patched,
+    # or the async cache API is not available (Django < 4.0).
+    if original_method is None or hasattr(
+        original_method, "_metrics_python_is_patched"
+    ):
+        return
 
     @functools.wraps(original_method)
-    def patched_method(*args: Any, **kwargs: Any) -> Any:
-        return _instrument_call(method_name, alias, original_method, args, kwargs)
+    async def patched_method(self: "BaseCache", *args: Any, **kwargs: Any) -> Any:
+        cache_metrics = getattr(self, "_metrics_python_metrics", None)
+
+        # Async calls executed by another cache call, like aget by the
+        # default aget_many, are part of the enclosing call.
+        if cache_metrics is None or _active_call.get() is not None:
+            return await original_method(self, *args, **kwargs)
+
+        metrics = cache_metrics[method_name]
 
-    setattr(cache, method_name, patched_method)
+        batch_size = None
+        if metrics.batch_size is not None:
+            args, kwargs, batch_size = _prepare_batch(args, kwargs)
+
+        async_call = _CacheCall()
+        token = _active_call.set(async_call)
+        entered = enter_component("cache")
+        try:
+            start = time.perf_counter()
+            value = await original_method(self, *args, **kwargs)
+            duration = time.perf_counter() - start
+        finally:
+            exit_component(entered)
+            _active_call.reset(token)
+
+        _observe_call(metrics, duration, value, batch_size)
+        _observe_payload(
+            metrics,
+            async_call,
+            method_name=method_name,
+            args=args,
+            kwargs=kwargs,
+            value=value,
+            estimate=self._metrics_python_estimate_payload_size,
+        )
+
+        key_prefix_metrics = self._metrics_python_key_prefix_metrics
+        if key_prefix_metrics is not None:
+            key_prefix_metrics.observe(
+                async_call,
+                method_name=method_name,
+                args=args,
+                kwargs=kwargs,
+                value=value,
+                duration=duration,
+                estimate=self._metrics_python_estimate_payload_size,
+            )
+
+        # Backends with a native async implementation don't use the
+        # executor, all of the time is spent in the backend.
+        if metrics.executor_wait is not None and async_call.nested_calls:
+            metrics.executor_wait.observe(
+                max(duration - async_call.backend_duration, 0)
+            )
+
+        return value
+
+    patched_method._metrics_python_is_patched = True  # type: ignore
+    setattr(cache_class, method_name, patched_method)
+
+
+def _patch_redis_serializer() -> None:
+    """
+    Observe the values serialized by the Redis cache backend, the size of
+    the serialized values and the time spent serializing them is added to
+    the cache call.
+    """
+
+    from django.core.cache.backends.redis import RedisSerializer
+
+    if hasattr(RedisSerializer, "_metrics_python_is_patched"):
+        return
+
+    original_dumps = RedisSerializer.dumps
+    original_loads = RedisSerializer.loads
+
+    @functools.wraps(original_dumps)
+    def dumps(self: RedisSerializer, obj: Any) -> Any:
+        call = _active_call.get()
+        if call is None:
+            return original_dumps(self, obj)
+
+        start = time.perf_counter()
+        data = original_dumps(self, obj)
+        call.observe_serializer(time.perf_counter() - start, data)
+
+        return data
+
+    @functools.wraps(original_loads)
+    def loads(self: RedisSerializer, data: Any) -> Any:
+        call = _active_call.get()
+        if call is None:
+            return original_loads(self, data)
+
+        start = time.perf_counter()
+        obj = original_loads(self, data)
+        call.observe_serializer(time.perf_counter() - start, data)
+
+        return obj
+
+    RedisSerializer.dumps = dumps
+    RedisSerializer.loads = loads
+    RedisSerializer._metrics_python_is_patched = True
 
 
 def _patch_cache(cache: "BaseCache", alias: str) -> None:
-    if not hasattr(cache, "_metrics_python_is_patched"):
+    # The methods are patched once per backend class, caches are created
+    # per thread by the cache handler.
+    cache_class = type(cache)
+    if "_metrics_python_is_patched" not in cache_class.__dict__:
         for method_name in METHODS_TO_INSTRUMENT:
-            _patch_cache_method(cache, method_name, alias)
+            _patch_cache_method(cache_class, method_name)
 
-        cache._metrics_python_is_patched = True
+        for method_name in ASYNC_METHODS_TO_INSTRUMENT:
+            _patch_async_cache_method(cache_class, method_name)
+
+        cache_class._metrics_python_is_patched = True
+
+    if not hasattr(cache, "_metrics_python_metrics"):
+        key_prefixes = get_key_prefixes()
+
+        cache._metrics_python_key_prefix_metrics = (
+            _KeyPrefixMetrics(alias, key_prefixes) if key_prefixes else None
+        )
+        cache._metrics_python_estimate_payload_size = (
+            settings.ESTIMATE_CACHE_PAYLOAD_SIZE
+        )
+        cache._metrics_python_metrics = _create_cache_metrics(alias)
 
 
 def patch_caching() -> None:
@@ -69,6 +650,8 @@ def patch_caching() -> None:
 
     from django.core import cache
 
+    _patch_redis_serializer()
+
     if not hasattr(cache.CacheHandler, "_metrics_python_is_patched"):
         original_create_connection = cache.CacheHandler.create_connection
 
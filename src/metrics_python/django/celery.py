@@ -5,9 +5,20 @@ from celery.app.trace import task_has_custom
 
 from ._metrics import (
     CELERY_DUPLICATE_QUERY_COUNT,
+    CELERY_N_PLUS_ONE_QUERY_COUNT,
+    CELERY_N_PLUS_ONE_QUERY_LOOP_SIZE,
     CELERY_QUERY_COUNT,
     CELERY_QUERY_DURATION,
+    CELERY_QUERY_FETCH_DURATION,
     CELERY_QUERY_REQUESTS_COUNT,
+    CELERY_QUERY_RESULT_SIZE,
+    CELERY_QUERY_ROW_COUNT,
+    CELERY_TABLE_QUERY_COUNT,
+    CELERY_TABLE_QUERY_DURATION,
+    CELERY_TRANSACTION_COUNT,
+    CELERY_TRANSACTION_DURATION,
+    CELERY_TRANSACTION_IDLE_DURATION,
+    CELERY_TRANSACTION_MAX_DURATION,
 )
 
 if TYPE_CHECKING:
@@ -48,6 +59,41 @@ def setup_celery_database_metrics() -> None:
     trace._metrics_python_is_patched = True
 
 
+def _measure_fetches(*, labels: dict[str, str], counter: "QueryCounter") -> None:
+    for (
+        db,
+        fetch_duration,
+    ) in counter.get_total_fetch_duration_seconds_by_alias().items():
+        CELERY_QUERY_FETCH_DURATION.labels(db=db, **labels).observe(fetch_duration)
+
+    for db, row_count in counter.get_total_fetch_row_count_by_alias().items():
+        CELERY_QUERY_ROW_COUNT.labels(db=db, **labels).inc(row_count)
+
+    for db, size in counter.get_total_fetch_size_by_alias().items():
+        CELERY_QUERY_RESULT_SIZE.labels(db=db, **labels).inc(size)
+
+
+def _measure_transactions(*, labels: dict[str, str], counter: "QueryCounter") -> None:
+    for (db, kind, outcome), count in counter.get_transaction_count().items():
+        CELERY_TRANSACTION_COUNT.labels(
+            db=db, kind=kind, outcome=outcome, **labels
+        ).inc(count)
+
+    for (db, kind), duration in counter.get_transaction_duration_seconds().items():
+        CELERY_TRANSACTION_DURATION.labels(db=db, kind=kind, **labels).observe(duration)
+
+    for (
+        db,
+        kind,
+    ), max_duration in counter.get_transaction_max_duration_seconds().items():
+        CELERY_TRANSACTION_MAX_DURATION.labels(db=db, kind=kind, **labels).observe(
+            max_duration
+        )
+
+    for db, idle_duration in counter.get_transaction_idle_duration_seconds().items():
+        CELERY_TRANSACTION_IDLE_DURATION.labels(db=db, **labels).observe(idle_duration)
+
+
 def _measure_task(*, task: Any, counter: "QueryCounter") -> None:
     labels = {"task": task.name}
 
@@ -67,9 +113,39 @@ def _measure_task(*, task: Any, counter: "QueryCounter") -> None:
 
     for (
         db,
-        query_count,
-    ) in counter.get_total_duplicate_query_count_by_alias().items():
-        CELERY_DUPLICATE_QUERY_COUNT.labels(db=db, **labels).inc(query_count)
+        duplicate_count,
+    ) in counter.get_estimated_duplicate_query_count_by_alias().items():
+        CELERY_DUPLICATE_QUERY_COUNT.labels(db=db, **labels).inc(duplicate_count)
+
+    for (
+        db,
+        n_plus_one_count,
+    ) in counter.get_estimated_n_plus_one_count_by_alias().items():
+        CELERY_N_PLUS_ONE_QUERY_COUNT.labels(db=db, **labels).inc(n_plus_one_count)
+
+    for (
+        db,
+        loop_sizes,
+    ) in counter.get_n_plus_one_loop_sizes_by_alias().items():
+        for loop_size in loop_sizes:
+            CELERY_N_PLUS_ONE_QUERY_LOOP_SIZE.labels(db=db, **labels).observe(loop_size)
+
+    for (db, table, kind), query_count in counter.get_table_query_count().items():
+        CELERY_TABLE_QUERY_COUNT.labels(db=db, table=table, kind=kind, **labels).inc(
+            query_count
+        )
+
+    for (
+        db,
+        table,
+        kind,
+    ), query_duration in counter.get_table_query_duration_seconds().items():
+        CELERY_TABLE_QUERY_DURATION.labels(db=db, table=table, kind=kind, **labels).inc(
+            query_duration
+        )
+
+    _measure_fetches(labels=labels, counter=counter)
+    _measure_transactions(labels=labels, counter=counter)
 
 
 def _wrap_task_call(task: Any, f: Any) -> Any:
@@ -81,10 +157,21 @@ def _wrap_task_call(task: Any, f: Any) -> Any:
             return f(*args, **kwargs)
 
         from ._query_counter import QueryCounter
+        from .conf import settings
+
+        duplicate_queries_sample_rate = (
+            settings.DUPLICATE_QUERIES_TASK_SAMPLE_RATES.get(
+                task.name, settings.DUPLICATE_QUERIES_SAMPLE_RATE
+            )
+        )
 
         # Initialize the query counter and measure the result after the task
         # is complete.
-        with QueryCounter.create_counter() as counter:
+        with QueryCounter.create_counter(
+            duplicate_queries_sample_rate=duplicate_queries_sample_rate,
+            get_name=lambda: str(task.name),
+            trace_id=getattr(task.request, "id", None),
+        ) as counter:
             result = f(*args, **kwargs)
             _measure_task(task=task, counter=counter)
             return result
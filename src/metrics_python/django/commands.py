@@ -8,13 +8,65 @@ from metrics_python.prometheus import push_metrics
 from ._metrics import (
     MANAGEMENT_COMMAND_DUPLICATE_QUERY_COUNT,
     MANAGEMENT_COMMAND_DURATION,
+    MANAGEMENT_COMMAND_N_PLUS_ONE_QUERY_COUNT,
+    MANAGEMENT_COMMAND_N_PLUS_ONE_QUERY_LOOP_SIZE,
     MANAGEMENT_COMMAND_QUERY_COUNT,
     MANAGEMENT_COMMAND_QUERY_DURATION,
+    MANAGEMENT_COMMAND_QUERY_FETCH_DURATION,
     MANAGEMENT_COMMAND_QUERY_REQUESTS_COUNT,
+    MANAGEMENT_COMMAND_QUERY_RESULT_SIZE,
+    MANAGEMENT_COMMAND_QUERY_ROW_COUNT,
+    MANAGEMENT_COMMAND_TABLE_QUERY_COUNT,
+    MANAGEMENT_COMMAND_TABLE_QUERY_DURATION,
+    MANAGEMENT_COMMAND_TRANSACTION_COUNT,
+    MANAGEMENT_COMMAND_TRANSACTION_DURATION,
+    MANAGEMENT_COMMAND_TRANSACTION_IDLE_DURATION,
+    MANAGEMENT_COMMAND_TRANSACTION_MAX_DURATION,
 )
 from ._query_counter import QueryCounter
 
 
+def _measure_fetches(*, labels: dict[str, str], counter: QueryCounter) -> None:
+    for (
+        db,
+        fetch_duration,
+    ) in counter.get_total_fetch_duration_seconds_by_alias().items():
+        MANAGEMENT_COMMAND_QUERY_FETCH_DURATION.labels(db=db, **labels).observe(
+            fetch_duration
+        )
+
+    for db, row_count in counter.get_total_fetch_row_count_by_alias().items():
+        MANAGEMENT_COMMAND_QUERY_ROW_COUNT.labels(db=db, **labels).inc(row_count)
+
+    for db, size in counter.get_total_fetch_size_by_alias().items():
+        MANAGEMENT_COMMAND_QUERY_RESULT_SIZE.labels(db=db, **labels).inc(size)
+
+
+def _measure_transactions(*, labels: dict[str, str], counter: QueryCounter) -> None:
+    for (db, kind, outcome), count in counter.get_transaction_count().items():
+        MANAGEMENT_COMMAND_TRANSACTION_COUNT.labels(
+            db=db, kind=kind, outcome=outcome, **labels
+        ).inc(count)
+
+    for (db, kind), duration in counter.get_transaction_duration_seconds().items():
+        MANAGEMENT_COMMAND_TRANSACTION_DURATION.labels(
+            db=db, kind=kind, **labels
+        ).observe(duration)
+
+    for (
+        db,
+        kind,
+    ), max_duration in counter.get_transaction_max_duration_seconds().items():
+        MANAGEMENT_COMMAND_TRANSACTION_MAX_DURATION.labels(
+            db=db, kind=kind, **labels
+        ).observe(max_duration)
+
+    for db, idle_duration in counter.get_transaction_idle_duration_seconds().items():
+        MANAGEMENT_COMMAND_TRANSACTION_IDLE_DURATION.labels(db=db, **labels).observe(
+            idle_duration
+        )
+
+
 def _measure_command(*, command: str, counter: QueryCounter) -> None:
     labels = {"command": command}
 
@@ -36,12 +88,46 @@ def _measure_command(*, command: str, counter: QueryCounter) -> None:
 
     for (
         db,
-        query_count,
-    ) in counter.get_total_duplicate_query_count_by_alias().items():
+        duplicate_count,
+    ) in counter.get_estimated_duplicate_query_count_by_alias().items():
         MANAGEMENT_COMMAND_DUPLICATE_QUERY_COUNT.labels(db=db, **labels).inc(
-            query_count
+            duplicate_count
         )
 
+    for (
+        db,
+        n_plus_one_count,
+    ) in counter.get_estimated_n_plus_one_count_by_alias().items():
+        MANAGEMENT_COMMAND_N_PLUS_ONE_QUERY_COUNT.labels(db=db, **labels).inc(
+            n_plus_one_count
+        )
+
+    for (
+        db,
+        loop_sizes,
+    ) in counter.get_n_plus_one_loop_sizes_by_alias().items():
+        for loop_size in loop_sizes:
+            MANAGEMENT_COMMAND_N_PLUS_ONE_QUERY_LOOP_SIZE.labels(
+                db=db, **labels
+            ).observe(loop_size)
+
+    for (db, table, kind), query_count in counter.get_table_query_count().items():
+        MANAGEMENT_COMMAND_TABLE_QUERY_COUNT.labels(
+            db=db, table=table, kind=kind, **labels
+        ).inc(query_count)
+
+    for (
+        db,
+        table,
+        kind,
+    ), query_duration in counter.get_table_query_duration_seconds().items():
+        MANAGEMENT_COMMAND_TABLE_QUERY_DURATION.labels(
+            db=db, table=table, kind=kind, **labels
+        ).inc(query_duration)
+
+    _measure_fetches(labels=labels, counter=counter)
+    _measure_transactions(labels=labels, counter=counter)
+
 
 def patch_commands() -> None:
     """Patch management commands."""
@@ -66,7 +152,9 @@ def patch_commands() -> None:
                 # Measure command duration.
                 MANAGEMENT_COMMAND_DURATION.labels(command=self.__module__).time(),
                 # Measure database queries
-                QueryCounter.create_counter() as counter,
+                QueryCounter.create_counter(
+                    get_name=lambda: str(self.__module__)
+                ) as counter,
             ):
                 value = old_execute(self, *args, **kwargs)
 
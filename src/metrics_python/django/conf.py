@@ -1,3 +1,5 @@
+from typing import Any, Callable
+
 from django.conf import settings as django_settings
 
 
@@ -22,6 +24,184 @@ class Settings:
             )
         )
 
+    @property
+    def MIDDLEWARE_SAMPLE_RATE(self) -> float:
+        return float(
+            getattr(
+                django_settings,
+                "METRICS_PYTHON_MIDDLEWARE_SAMPLE_RATE",
+                1.0,
+            )
+        )
+
+    @property
+    def DUPLICATE_QUERIES_MAX_CALL_SITES(self) -> int:
+        return int(
+            getattr(
+                django_settings,
+                "METRICS_PYTHON_DUPLICATE_QUERIES_MAX_CALL_SITES",
+                1000,
+            )
+        )
+
+    @property
+    def DUPLICATE_QUERIES_SAMPLE_RATE(self) -> float:
+        return float(
+            getattr(
+                django_settings,
+                "METRICS_PYTHON_DUPLICATE_QUERIES_SAMPLE_RATE",
+                1.0,
+            )
+        )
+
+    @property
+    def DUPLICATE_QUERIES_VIEW_SAMPLE_RATES(self) -> dict[str, float]:
+        return dict(
+            getattr(
+                django_settings,
+                "METRICS_PYTHON_DUPLICATE_QUERIES_VIEW_SAMPLE_RATES",
+                {},
+            )
+        )
+
+    @property
+    def DUPLICATE_QUERIES_TASK_SAMPLE_RATES(self) -> dict[str, float]:
+        return dict(
+            getattr(
+                django_settings,
+                "METRICS_PYTHON_DUPLICATE_QUERIES_TASK_SAMPLE_RATES",
+                {},
+            )
+        )
+
+    @property
+    def N_PLUS_ONE_THRESHOLD(self) -> int:
+        return int(
+            getattr(
+                django_settings,
+                "METRICS_PYTHON_N_PLUS_ONE_THRESHOLD",
+                5,
+            )
+        )
+
+    @property
+    def TRACK_TOP_STATEMENTS(self) -> bool:
+        return bool(
+            getattr(
+                django_settings,
+                "METRICS_PYTHON_TRACK_TOP_STATEMENTS",
+                False,
+            )
+        )
+
+    @property
+    def TOP_STATEMENTS_CAPACITY(self) -> int:
+        return int(
+            getattr(
+                django_settings,
+                "METRICS_PYTHON_TOP_STATEMENTS_CAPACITY",
+                100,
+            )
+        )
+
+    @property
+    def OBSERVE_QUERY_DURATION(self) -> bool:
+        return bool(
+            getattr(
+                django_settings,
+                "METRICS_PYTHON_OBSERVE_QUERY_DURATION",
+                False,
+            )
+        )
+
+    @property
+    def OBSERVE_TABLE_QUERIES(self) -> bool:
+        return bool(
+            getattr(
+                django_settings,
+                "METRICS_PYTHON_OBSERVE_TABLE_QUERIES",
+                False,
+            )
+        )
+
+    @property
+    def OBSERVE_CACHE_KEY_PREFIXES(self) -> bool:
+        return bool(
+            getattr(
+                django_settings,
+                "METRICS_PYTHON_OBSERVE_CACHE_KEY_PREFIXES",
+                False,
+            )
+        )
+
+    @property
+    def CACHE_KEY_PREFIX_EXTRACTOR(self) -> Callable[[Any], str] | str | None:
+        return getattr(
+            django_settings,
+            "METRICS_PYTHON_CACHE_KEY_PREFIX_EXTRACTOR",
+            None,
+        )
+
+    @property
+    def CACHE_KEY_PREFIX_MAX_COUNT(self) -> int:
+        return int(
+            getattr(
+                django_settings,
+                "METRICS_PYTHON_CACHE_KEY_PREFIX_MAX_COUNT",
+                50,
+            )
+        )
+
+    @property
+    def ESTIMATE_CACHE_PAYLOAD_SIZE(self) -> bool:
+        return bool(
+            getattr(
+                django_settings,
+                "METRICS_PYTHON_ESTIMATE_CACHE_PAYLOAD_SIZE",
+                False,
+            )
+        )
+
+    @property
+    def EXPLAIN_SLOW_QUERIES(self) -> bool:
+        return bool(
+            getattr(
+                django_settings,
+                "METRICS_PYTHON_EXPLAIN_SLOW_QUERIES",
+                False,
+            )
+        )
+
+    @property
+    def SLOW_QUERY_THRESHOLD(self) -> float:
+        return float(
+            getattr(
+                django_settings,
+                "METRICS_PYTHON_SLOW_QUERY_THRESHOLD",
+                1.0,
+            )
+        )
+
+    @property
+    def EXPLAIN_SAMPLE_RATE(self) -> float:
+        return float(
+            getattr(
+                django_settings,
+                "METRICS_PYTHON_EXPLAIN_SAMPLE_RATE",
+                0.1,
+            )
+        )
+
+    @property
+    def SLOW_QUERY_PLANS_SIZE(self) -> int:
+        return int(
+            getattr(
+                django_settings,
+                "METRICS_PYTHON_SLOW_QUERY_PLANS_SIZE",
+                100,
+            )
+        )
+
     @property
     def PUSHGATEWAY(self) -> str | None:
         return getattr(
@@ -1,23 +1,49 @@
 import asyncio
 import contextlib
+import random
 import time
 from contextvars import ContextVar
 from functools import wraps
 from logging import getLogger
-from typing import Any, Callable, Coroutine, Generator, Optional, cast
+from typing import Any, Callable, Coroutine, cast
 
-from django.http import HttpRequest, HttpResponse
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
 from django.utils.decorators import sync_and_async_middleware
 
+from ._latency import (
+    COMPONENTS,
+    LatencyBreakdown,
+    enter_component,
+    exit_component,
+    start_request,
+)
 from ._metrics import (
     MIDDLEWARE_DURATION,
+    VIEW_COMPONENT_DURATION,
     VIEW_DUPLICATE_QUERY_COUNT,
+    VIEW_N_PLUS_ONE_QUERY_COUNT,
+    VIEW_N_PLUS_ONE_QUERY_LOOP_SIZE,
     VIEW_QUERY_COUNT,
     VIEW_QUERY_DURATION,
+    VIEW_QUERY_FETCH_DURATION,
     VIEW_QUERY_REQUESTS_COUNT,
+    VIEW_QUERY_RESULT_SIZE,
+    VIEW_QUERY_ROW_COUNT,
+    VIEW_STREAM_DURATION,
+    VIEW_STREAM_QUERY_COUNT,
+    VIEW_STREAM_SIZE,
+    VIEW_STREAM_TIME_TO_FIRST_BYTE,
+    VIEW_TABLE_QUERY_COUNT,
+    VIEW_TABLE_QUERY_DURATION,
+    VIEW_TRANSACTION_COUNT,
+    VIEW_TRANSACTION_DURATION,
+    VIEW_TRANSACTION_IDLE_DURATION,
+    VIEW_TRANSACTION_MAX_DURATION,
 )
-from ._query_counter import QueryCounter
-from ._utils import get_request_method, get_view_name
+from ._query_counter import QueryCounter, _active_counter, _patch_cursor_wrapper
+from ._streaming import StreamStats, wrap_streaming_response
+from ._utils import get_request_method, get_trace_id, get_view_name
+from .conf import settings
 
 logger = getLogger(__name__)
 
@@ -28,12 +54,62 @@ _import_string_should_wrap_middleware: ContextVar[bool] = ContextVar(
     "import_string_should_wrap_middleware"
 )
 
+# Time spent in get_response by the middleware call being timed, kept per
+# request context. Each middleware call sets it to 0 when it starts, the
+# wrapped get_response adds to it, and the value of the enclosing
+# middleware is restored when the call ends.
+_get_response_duration: ContextVar[float] = ContextVar(
+    "metrics_python_get_response_duration", default=0.0
+)
+
+# Whether middleware durations are observed for the current request, None
+# outside of a request. The decision is made once per request by the
+# outermost wrapped middleware.
+_middleware_sampled: ContextVar[bool | None] = ContextVar(
+    "metrics_python_middleware_sampled", default=None
+)
+
 
 #
 # Request query counter
 #
 
 
+def _measure_fetches(*, labels: dict[str, str], counter: QueryCounter) -> None:
+    for (
+        db,
+        fetch_duration,
+    ) in counter.get_total_fetch_duration_seconds_by_alias().items():
+        VIEW_QUERY_FETCH_DURATION.labels(db=db, **labels).observe(fetch_duration)
+
+    for db, row_count in counter.get_total_fetch_row_count_by_alias().items():
+        VIEW_QUERY_ROW_COUNT.labels(db=db, **labels).inc(row_count)
+
+    for db, size in counter.get_total_fetch_size_by_alias().items():
+        VIEW_QUERY_RESULT_SIZE.labels(db=db, **labels).inc(size)
+
+
+def _measure_transactions(*, labels: dict[str, str], counter: QueryCounter) -> None:
+    for (db, kind, outcome), count in counter.get_transaction_count().items():
+        VIEW_TRANSACTION_COUNT.labels(db=db, kind=kind, outcome=outcome, **labels).inc(
+            count
+        )
+
+    for (db, kind), duration in counter.get_transaction_duration_seconds().items():
+        VIEW_TRANSACTION_DURATION.labels(db=db, kind=kind, **labels).observe(duration)
+
+    for (
+        db,
+        kind,
+    ), max_duration in counter.get_transaction_max_duration_seconds().items():
+        VIEW_TRANSACTION_MAX_DURATION.labels(db=db, kind=kind, **labels).observe(
+            max_duration
+        )
+
+    for db, idle_duration in counter.get_transaction_idle_duration_seconds().items():
+        VIEW_TRANSACTION_IDLE_DURATION.labels(db=db, **labels).observe(idle_duration)
+
+
 def _measure_request(
     *, request: HttpRequest, response: HttpResponse, counter: QueryCounter
 ) -> None:
@@ -59,9 +135,130 @@ def _measure_request(
 
     for (
         db,
-        query_count,
-    ) in counter.get_total_duplicate_query_count_by_alias().items():
-        VIEW_DUPLICATE_QUERY_COUNT.labels(db=db, **labels).inc(query_count)
+        duplicate_count,
+    ) in counter.get_estimated_duplicate_query_count_by_alias().items():
+        VIEW_DUPLICATE_QUERY_COUNT.labels(db=db, **labels).inc(duplicate_count)
+
+    for (
+        db,
+        n_plus_one_count,
+    ) in counter.get_estimated_n_plus_one_count_by_alias().items():
+        VIEW_N_PLUS_ONE_QUERY_COUNT.labels(db=db, **labels).inc(n_plus_one_count)
+
+    for (
+        db,
+        loop_sizes,
+    ) in counter.get_n_plus_one_loop_sizes_by_alias().items():
+        for loop_size in loop_sizes:
+            VIEW_N_PLUS_ONE_QUERY_LOOP_SIZE.labels(db=db, **labels).observe(loop_size)
+
+    for (db, table, kind), query_count in counter.get_table_query_count().items():
+        VIEW_TABLE_QUERY_COUNT.labels(db=db, table=table, kind=kind, **labels).inc(
+            query_count
+        )
+
+    for (
+        db,
+        table,
+        kind,
+    ), query_duration in counter.get_table_query_duration_seconds().items():
+        VIEW_TABLE_QUERY_DURATION.labels(db=db, table=table, kind=kind, **labels).inc(
+            query_duration
+        )
+
+    _measure_fetches(labels=labels, counter=counter)
+    _measure_transactions(labels=labels, counter=counter)
+
+
+def _create_counter(
+    request: HttpRequest,
+) -> contextlib.AbstractContextManager[QueryCounter]:
+    return QueryCounter.create_counter(
+        get_name=lambda: get_view_name(request),
+        trace_id=get_trace_id(request),
+    )
+
+
+def _set_view_duplicate_queries_sample_rate(request: HttpRequest) -> None:
+    """
+    Apply the duplicate queries sample rate of the view to the query counter
+    of the request. The counter is created before the URL resolver has run,
+    the view is known once process_view is called.
+    """
+
+    view_sample_rates = settings.DUPLICATE_QUERIES_VIEW_SAMPLE_RATES
+    if not view_sample_rates:
+        return
+
+    counter = _active_counter.get()
+    view = get_view_name(request)
+    if counter is not None and view in view_sample_rates:
+        counter.set_duplicate_queries_sample_rate(view_sample_rates[view])
+
+
+def _measure_stream(
+    *,
+    request: HttpRequest,
+    response: HttpResponse,
+    stats: StreamStats,
+    query_count: dict[str, int],
+) -> None:
+    method = get_request_method(request)
+    view = get_view_name(request)
+    status = str(response.status_code)
+
+    labels = {"method": method, "view": view, "status": status}
+
+    if stats.time_to_first_byte is not None:
+        VIEW_STREAM_TIME_TO_FIRST_BYTE.labels(**labels).observe(
+            stats.time_to_first_byte
+        )
+
+    VIEW_STREAM_DURATION.labels(**labels).observe(stats.duration)
+    VIEW_STREAM_SIZE.labels(**labels).inc(stats.size)
+
+    for db, count in query_count.items():
+        VIEW_STREAM_QUERY_COUNT.labels(db=db, **labels).inc(count)
+
+
+def _finish_request(
+    *,
+    request: HttpRequest,
+    response: HttpResponse,
+    counter: QueryCounter,
+    start: float,
+) -> None:
+    if not response.streaming:
+        _measure_request(request=request, response=response, counter=counter)
+        return
+
+    # The body of streaming responses is produced after get_response has
+    # returned, queries executed while the stream is consumed are added to
+    # the counter and the request is measured when the stream is closed.
+    query_count_before_stream = dict(counter.get_total_query_count_by_alias())
+    counter.defer_finish()
+
+    def on_close(stats: StreamStats) -> None:
+        stream_query_count = {
+            db: count - query_count_before_stream.get(db, 0)
+            for db, count in counter.get_total_query_count_by_alias().items()
+        }
+
+        counter.finish()
+        _measure_request(request=request, response=response, counter=counter)
+        _measure_stream(
+            request=request,
+            response=response,
+            stats=stats,
+            query_count=stream_query_count,
+        )
+
+    wrap_streaming_response(
+        cast(StreamingHttpResponse, response),
+        start=start,
+        counter=counter,
+        on_close=on_close,
+    )
 
 
 @sync_and_async_middleware  # type: ignore
@@ -71,21 +268,145 @@ def QueryCountMiddleware(
     if asyncio.iscoroutinefunction(get_response):
 
         async def async_middleware(request: HttpRequest) -> HttpResponse:
-            with QueryCounter.create_counter() as counter:
+            start = time.perf_counter()
+
+            with _create_counter(request) as counter:
                 response = await cast(ASYNC_MIDDLEWARE, get_response)(request)
-                _measure_request(request=request, response=response, counter=counter)
+                _finish_request(
+                    request=request, response=response, counter=counter, start=start
+                )
 
                 return response
 
+        async def async_process_view(
+            request: HttpRequest, view_func: Any, view_args: Any, view_kwargs: Any
+        ) -> None:
+            _set_view_duplicate_queries_sample_rate(request)
+
+        async_middleware.process_view = async_process_view  # type: ignore
         return async_middleware
 
     def middleware(request: HttpRequest) -> HttpResponse:
-        with QueryCounter.create_counter() as counter:
+        start = time.perf_counter()
+
+        with _create_counter(request) as counter:
             response = cast(MIDDLEWARE, get_response)(request)
-            _measure_request(request=request, response=response, counter=counter)
+            _finish_request(
+                request=request, response=response, counter=counter, start=start
+            )
+
+            return response
+
+    def process_view(
+        request: HttpRequest, view_func: Any, view_args: Any, view_kwargs: Any
+    ) -> None:
+        _set_view_duplicate_queries_sample_rate(request)
+
+    middleware.process_view = process_view  # type: ignore
+    return middleware
+
+
+#
+# Request latency breakdown
+#
+
+
+def _measure_latency_breakdown(
+    *, request: HttpRequest, response: HttpResponse, breakdown: LatencyBreakdown
+) -> None:
+    method = get_request_method(request)
+    view = get_view_name(request)
+    status = str(response.status_code)
+
+    # Every component is observed for every request, components the request
+    # did not spend time in are observed as 0 to keep percentiles comparable.
+    for component in COMPONENTS:
+        VIEW_COMPONENT_DURATION.labels(
+            method=method, view=view, status=status, component=component
+        ).observe(breakdown.durations[component])
+
+
+def _patch_make_view_atomic() -> None:
+    """
+    Time views as the view component. BaseHandler.make_view_atomic is
+    called with the resolved view for every request, the view is wrapped
+    before it is called.
+    """
+
+    from django.core.handlers.base import BaseHandler
+
+    if hasattr(BaseHandler.make_view_atomic, "_metrics_python_is_patched"):
+        return
+
+    old_make_view_atomic = BaseHandler.make_view_atomic
+
+    @wraps(old_make_view_atomic)
+    def make_view_atomic(self: BaseHandler, view: Any) -> Any:
+        view = old_make_view_atomic(self, view)
+
+        if asyncio.iscoroutinefunction(view):
+
+            async def async_view(*args: Any, **kwargs: Any) -> Any:
+                entered = enter_component("view")
+                try:
+                    return await view(*args, **kwargs)
+                finally:
+                    exit_component(entered)
+
+            return async_view
+
+        def sync_view(*args: Any, **kwargs: Any) -> Any:
+            entered = enter_component("view")
+            try:
+                return view(*args, **kwargs)
+            finally:
+                exit_component(entered)
+
+        return sync_view
+
+    make_view_atomic._metrics_python_is_patched = True  # type: ignore
+    BaseHandler.make_view_atomic = make_view_atomic
+
+
+@sync_and_async_middleware  # type: ignore
+def LatencyBreakdownMiddleware(
+    get_response: MIDDLEWARE | ASYNC_MIDDLEWARE,
+) -> MIDDLEWARE | ASYNC_MIDDLEWARE:
+    _patch_make_view_atomic()
+    _patch_cursor_wrapper()
+
+    if asyncio.iscoroutinefunction(get_response):
+
+        async def async_middleware(request: HttpRequest) -> HttpResponse:
+            breakdown = LatencyBreakdown()
+            request_entered = start_request(breakdown)
+            try:
+                response = await cast(ASYNC_MIDDLEWARE, get_response)(request)
+            finally:
+                exit_component(request_entered)
+
+            _measure_latency_breakdown(
+                request=request, response=response, breakdown=breakdown
+            )
 
             return response
 
+        return async_middleware
+
+    def middleware(request: HttpRequest) -> HttpResponse:
+        breakdown = LatencyBreakdown()
+        request_entered = start_request(breakdown)
+        try:
+            response = cast(MIDDLEWARE, get_response)(request)
+        finally:
+            exit_component(request_entered)
+
+        _measure_latency_breakdown(
+            request=request, response=response, breakdown=breakdown
+        )
+
+        return response
+
     return middleware
 
 
@@ -125,6 +446,10 @@ def patch_middlewares() -> None:
     base._metrics_python_is_patched = True
 
 
+def _sample_middlewares(sample_rate: float) -> bool:
+    return sample_rate >= 1.0 or random.random() < sample_rate
+
+
 def _wrap_middleware(middleware: Any, middleware_name: str) -> Any:  # noqa
     def _middleware_method(old_method: Any) -> str:
         """
@@ -137,82 +462,89 @@ def _wrap_middleware(middleware: Any, middleware_name: str) -> Any:  # noqa
 
         return str(function_basename)
 
-    @contextlib.contextmanager
-    def _middleware_timer(
-        old_method: Any,
-        middleware: Optional["MetricsPythonWrappingMiddleware"] = None,
-    ) -> Generator[None, None, None]:
-        """
-        Return a generator that is used to measure the method execution duration.
-        """
-
-        method_name = _middleware_method(old_method)
-
-        start = time.perf_counter()
-
-        yield
-
-        duration = time.perf_counter() - start
-
-        if middleware:
-            get_response_duration = getattr(
-                middleware, "_metric_python_get_response_duration", None
-            )
-            if not get_response_duration:
-                logger.warning(
-                    "Middleware was provided, but no get_response duration was found."
-                )
-            else:
-                duration = max(duration - get_response_duration, 0)
-
-            middleware._metric_python_get_response_duration = None
-
-        MIDDLEWARE_DURATION.labels(
-            middleware=middleware_name, method=method_name
-        ).observe(duration)
-
     def _get_wrapped_method(old_method: Any) -> Any:
         """
         Wrap decorator method to mesure execution duration.
         """
 
-        def metrics_python_wrapped_method(*args: Any, **kwargs: Any) -> Any:
-            with _middleware_timer(old_method=old_method):
-                return old_method(*args, **kwargs)
+        histogram = MIDDLEWARE_DURATION.labels(
+            middleware=middleware_name, method=_middleware_method(old_method)
+        )
 
-        wrapped_method = wraps(old_method)(metrics_python_wrapped_method)
-        # Django compat.
-        wrapped_method.__self__ = old_method.__self__  # type: ignore
+        def metrics_python_wrapped_method(*args: Any, **kwargs: Any) -> Any:
+            entered = enter_component("middleware")
+            try:
+                if _middleware_sampled.get() is False:
+                    return old_method(*args, **kwargs)
+
+                start = time.perf_counter()
+                rv = old_method(*args, **kwargs)
+                histogram.observe(time.perf_counter() - start)
+
+                return rv
+            finally:
+                exit_component(entered)
+
+        async def metrics_python_wrapped_async_method(*args: Any, **kwargs: Any) -> Any:
+            entered = enter_component("middleware")
+            try:
+                if _middleware_sampled.get() is False:
+                    return await old_method(*args, **kwargs)
+
+                start = time.perf_counter()
+                rv = await old_method(*args, **kwargs)
+                histogram.observe(time.perf_counter() - start)
+
+                return rv
+            finally:
+                exit_component(entered)
+
+        # Django adapts hooks to the mode of the handler by checking whether
+        # they are coroutine functions, async hooks have to stay async.
+        wrapped_method = wraps(old_method)(
+            metrics_python_wrapped_async_method
+            if asyncio.iscoroutinefunction(old_method)
+            else metrics_python_wrapped_method
+        )
+
+        # Django compat. Hooks of function-based middlewares are plain
+        # functions without __self__.
+        if hasattr(old_method, "__self__"):
+            wrapped_method.__self__ = old_method.__self__  # type: ignore
 
         return wrapped_method
 
-    def _get_wrapped_get_response(
-        get_response: Any, middleware: "MetricsPythonWrappingMiddleware"
-    ) -> Any:
+    def _get_wrapped_get_response(get_response: Any) -> Any:
         """
         We need to wrap get_response to subtract the time used by other
         middlewares and the view to get the time actually spent in the
         current middleware.
         """
 
-        @contextlib.contextmanager
-        def _get_response_timer() -> Generator[None, None, None]:
-            start = time.perf_counter()
-
-            yield
+        def _get_response(*args: Any, **kwargs: Any) -> Any:
+            if _middleware_sampled.get() is False:
+                return get_response(*args, **kwargs)
 
-            middleware._metric_python_get_response_duration = (
-                time.perf_counter() - start
+            start = time.perf_counter()
+            rv = get_response(*args, **kwargs)
+            _get_response_duration.set(
+                _get_response_duration.get() + time.perf_counter() - start
             )
 
-        def _get_response(*args: Any, **kwargs: Any) -> Any:
-            with _get_response_timer():
-                return get_response(*args, **kwargs)
+            return rv
 
         async def _aget_response(*args: Any, **kwargs: Any) -> Any:
-            with _get_response_timer():
+            if _middleware_sampled.get() is False:
                 return await get_response(*args, **kwargs)
 
+            start = time.perf_counter()
+            rv = await get_response(*args, **kwargs)
+            _get_response_duration.set(
+                _get_response_duration.get() + time.perf_counter() - start
+            )
+
+            return rv
+
         if asyncio.iscoroutinefunction(get_response):
             return wraps(get_response)(_aget_response)
 
@@ -224,27 +556,36 @@ def _wrap_middleware(middleware: Any, middleware_name: str) -> Any:  # noqa
         def __init__(self, get_response: Any = None, *args: Any, **kwargs: Any) -> None:
             if get_response:
                 self._inner = middleware(
-                    _get_wrapped_get_response(get_response, self), *args, **kwargs
+                    _get_wrapped_get_response(get_response), *args, **kwargs
                 )
             else:
                 self._inner = middleware(*args, **kwargs)
 
             # Used to identify if this is an async middleware or not.
             self.get_response = get_response
+            self._is_async = asyncio.iscoroutinefunction(get_response)
 
-            self._call_method = None
-            self._acall_method = None
-            self._metric_python_get_response_duration: float | None = None
+            # The method called for each request, the label children and the
+            # sample rate are resolved once when the middleware is loaded.
+            self._sample_rate = settings.MIDDLEWARE_SAMPLE_RATE
+            if self._is_async:
+                self._method = getattr(self._inner, "__acall__", self._inner)
+            else:
+                self._method = self._inner.__call__
+
+            self._histogram = MIDDLEWARE_DURATION.labels(
+                middleware=middleware_name, method=_middleware_method(self._method)
+            )
 
             if self.async_capable:
                 self._async_check()
 
         def _async_check(self) -> None:
-            if asyncio.iscoroutinefunction(self.get_response):
+            if self._is_async:
                 self._is_coroutine = asyncio.coroutines._is_coroutine  # type: ignore
 
         def async_route_check(self) -> bool:
-            return asyncio.iscoroutinefunction(self.get_response)
+            return self._is_async
 
         def __getattr__(self, method_name: str) -> Any:
             if method_name not in (
@@ -262,26 +603,75 @@ def _wrap_middleware(middleware: Any, middleware_name: str) -> Any:  # noqa
             return rv
 
         def __call__(self, *args: Any, **kwargs: Any) -> Any:
-            if self.async_route_check():
+            if self._is_async:
                 return self.__acall__(*args, **kwargs)
 
-            f = self._call_method
-            if f is None:
-                self._call_method = f = self._inner.__call__
+            sampled = _middleware_sampled.get()
+            if sampled is None:
+                # The outermost middleware decides if the middlewares are
+                # observed for this request.
+                sampled_token = _middleware_sampled.set(
+                    _sample_middlewares(self._sample_rate)
+                )
+                try:
+                    return self.__call__(*args, **kwargs)
+                finally:
+                    _middleware_sampled.reset(sampled_token)
+
+            entered = enter_component("middleware")
+            try:
+                if not sampled:
+                    return self._method(*args, **kwargs)
+
+                return self._timed_call(*args, **kwargs)
+            finally:
+                exit_component(entered)
+
+        def _timed_call(self, *args: Any, **kwargs: Any) -> Any:
+            token = _get_response_duration.set(0.0)
+            try:
+                start = time.perf_counter()
+                rv = self._method(*args, **kwargs)
+                duration = time.perf_counter() - start - _get_response_duration.get()
+            finally:
+                _get_response_duration.reset(token)
+
+            self._histogram.observe(max(duration, 0))
 
-            with _middleware_timer(old_method=f, middleware=self):
-                return f(*args, **kwargs)
+            return rv
 
         async def __acall__(self, *args: Any, **kwargs: Any) -> Any:
-            f = self._acall_method
-            if f is None:
-                if hasattr(self._inner, "__acall__"):
-                    self._acall_method = f = self._inner.__acall__
-                else:
-                    self._acall_method = f = self._inner
-
-            with _middleware_timer(old_method=f, middleware=self):
-                return await f(*args, **kwargs)
+            sampled = _middleware_sampled.get()
+            if sampled is None:
+                sampled_token = _middleware_sampled.set(
+                    _sample_middlewares(self._sample_rate)
+                )
+                try:
+                    return await self.__acall__(*args, **kwargs)
+                finally:
+                    _middleware_sampled.reset(sampled_token)
+
+            entered = enter_component("middleware")
+            try:
+                if not sampled:
+                    return await self._method(*args, **kwargs)
+
+                return await self._atimed_call(*args, **kwargs)
+            finally:
+                exit_component(entered)
+
+        async def _atimed_call(self, *args: Any, **kwargs: Any) -> Any:
+            token = _get_response_duration.set(0.0)
+            try:
+                start = time.perf_counter()
+                rv = await self._method(*args, **kwargs)
+                duration = time.perf_counter() - start - _get_response_duration.get()
+            finally:
+                _get_response_duration.reset(token)
+
+            self._histogram.observe(max(duration, 0))
+
+            return rv
 
     for attr in (
         "__name__",
@@ -1,29 +1,242 @@
-from typing import Any
+import time
+from functools import cached_property
+from typing import Any, Iterable, NamedTuple
 
 from django.db.backends.postgresql import base
+from prometheus_client.core import GaugeMetricFamily, Metric
+from prometheus_client.metrics import Counter, Histogram
+from prometheus_client.registry import Collector
 
+from metrics_python.constants import NAMESPACE
+from metrics_python.django._cursor import (
+    MetricsCursorDebugWrapper,
+    MetricsCursorWrapper,
+)
 from metrics_python.django._metrics import (
+    DATABASE_CONNECTION_AGE,
+    DATABASE_CONNECTION_REUSE_COUNT,
+    DATABASE_FORCED_RECONNECT_COUNT,
     DATABASE_GET_NEW_CONNECTION_HISTOGRAM,
+    DATABASE_HEALTH_CHECK_DURATION,
+    DATABASE_HEALTH_CHECK_FAILURE_COUNT,
     DATABASE_INIT_CONNECTION_STATE_HISTOGRAM,
+    DATABASE_POOL_CHECKOUT_DURATION,
+    DATABASE_POOL_CHECKOUT_TIMEOUT_COUNT,
 )
 
 
+class _ConnectionMetrics(NamedTuple):
+    get_new_connection: Histogram
+    init_connection_state: Histogram
+    pool_checkout_duration: Histogram
+    pool_checkout_timeout: Counter
+    health_check_duration: Histogram
+    health_check_failure: Counter
+    forced_reconnect: Counter
+    new_connection: Counter
+    reused_connection: Counter
+    connection_age: Histogram
+
+
 class DatabaseWrapper(base.DatabaseWrapper):  # type: ignore
+    # Monotonic time the current connection was opened.
+    _metrics_python_connected_at: float | None = None
+    # Whether the connection has been used since the last request boundary,
+    # where Django closes unusable or obsolete connections.
+    _metrics_python_connection_used = False
+
+    # The connection settings the connection metrics were resolved for.
+    _metrics_python_connection_settings: tuple[Any, ...] | None = None
+
+    @cached_property
+    def _metrics_python_metrics(self) -> _ConnectionMetrics:
+        """
+        Label children of the connection metrics, resolved once instead of
+        on every connect. The children are resolved again by connect() when
+        the connection settings change, like when the test runner renames
+        the database of the wrapper.
+        """
+
+        self._metrics_python_connection_settings = self._get_connection_settings()
+
+        conn_params = self.get_connection_params()
+        connection_labels = {
+            "database_host": conn_params.get("host", "unknown"),
+            "database_port": conn_params.get("port", "unknown"),
+            "database_name": conn_params.get("dbname", "unknown"),
+            "database_username": conn_params.get("user", "unknown"),
+        }
+
+        return _ConnectionMetrics(
+            get_new_connection=DATABASE_GET_NEW_CONNECTION_HISTOGRAM.labels(
+                **connection_labels
+            ),
+            init_connection_state=DATABASE_INIT_CONNECTION_STATE_HISTOGRAM.labels(
+                **connection_labels
+            ),
+            pool_checkout_duration=DATABASE_POOL_CHECKOUT_DURATION.labels(
+                db=self.alias
+            ),
+            pool_checkout_timeout=DATABASE_POOL_CHECKOUT_TIMEOUT_COUNT.labels(
+                db=self.alias
+            ),
+            health_check_duration=DATABASE_HEALTH_CHECK_DURATION.labels(db=self.alias),
+            health_check_failure=DATABASE_HEALTH_CHECK_FAILURE_COUNT.labels(
+                db=self.alias
+            ),
+            forced_reconnect=DATABASE_FORCED_RECONNECT_COUNT.labels(db=self.alias),
+            new_connection=DATABASE_CONNECTION_REUSE_COUNT.labels(
+                db=self.alias, reused="false"
+            ),
+            reused_connection=DATABASE_CONNECTION_REUSE_COUNT.labels(
+                db=self.alias, reused="true"
+            ),
+            connection_age=DATABASE_CONNECTION_AGE.labels(db=self.alias),
+        )
+
     def get_new_connection(self, conn_params: dict[str, Any]) -> Any:
-        with DATABASE_GET_NEW_CONNECTION_HISTOGRAM.labels(
-            database_host=conn_params.get("host", "unknown"),
-            database_port=conn_params.get("port", "unknown"),
-            database_name=conn_params.get("dbname", "unknown"),
-            database_username=conn_params.get("user", "unknown"),
-        ).time():
+        with self._metrics_python_metrics.get_new_connection.time():
+            # Connection pooling is supported from Django 5.1.
+            if getattr(self, "pool", None):
+                return self._get_pooled_connection(conn_params)
+
+            return super().get_new_connection(conn_params)
+
+    def _get_pooled_connection(self, conn_params: dict[str, Any]) -> Any:
+        from psycopg_pool import PoolTimeout
+
+        metrics = self._metrics_python_metrics
+
+        start = time.perf_counter()
+        try:
             return super().get_new_connection(conn_params)
+        except PoolTimeout:
+            metrics.pool_checkout_timeout.inc()
+            raise
+        finally:
+            metrics.pool_checkout_duration.observe(time.perf_counter() - start)
 
     def init_connection_state(self) -> Any:
-        conn_params = self.get_connection_params()
-        with DATABASE_INIT_CONNECTION_STATE_HISTOGRAM.labels(
-            database_host=conn_params.get("host", "unknown"),
-            database_port=conn_params.get("port", "unknown"),
-            database_name=conn_params.get("dbname", "unknown"),
-            database_username=conn_params.get("user", "unknown"),
-        ).time():
+        with self._metrics_python_metrics.init_connection_state.time():
             return super().init_connection_state()
+
+    def is_usable(self) -> bool:
+        metrics = self._metrics_python_metrics
+
+        start = time.perf_counter()
+        try:
+            usable = bool(super().is_usable())
+        except Exception:
+            metrics.health_check_failure.inc()
+            raise
+        finally:
+            metrics.health_check_duration.observe(time.perf_counter() - start)
+
+        if not usable:
+            metrics.health_check_failure.inc()
+
+        return usable
+
+    def close_if_health_check_failed(self) -> None:
+        connection = self.connection
+        super().close_if_health_check_failed()
+
+        # The connection is closed when it failed the health check, a new
+        # connection is opened when the connection is used next.
+        if connection is not None and self.connection is None:
+            self._metrics_python_metrics.forced_reconnect.inc()
+
+    def _get_connection_settings(self) -> tuple[Any, ...]:
+        return tuple(
+            self.settings_dict.get(key)
+            for key in ("HOST", "PORT", "NAME", "USER", "OPTIONS")
+        )
+
+    def connect(self) -> None:
+        if (
+            "_metrics_python_metrics" in self.__dict__
+            and self._get_connection_settings()
+            != self._metrics_python_connection_settings
+        ):
+            del self._metrics_python_metrics
+
+        super().connect()
+
+        self._metrics_python_connected_at = time.monotonic()
+        self._metrics_python_connection_used = True
+        self._metrics_python_metrics.new_connection.inc()
+
+    def ensure_connection(self) -> None:
+        if self.connection is not None and not self._metrics_python_connection_used:
+            self._metrics_python_connection_used = True
+            self._metrics_python_metrics.reused_connection.inc()
+
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self) -> None:
+        super().close_if_unusable_or_obsolete()
+        self._metrics_python_connection_used = False
+
+    def close(self) -> None:
+        connected_at = self._metrics_python_connected_at
+        if self.connection is not None and connected_at is not None:
+            self._metrics_python_metrics.connection_age.observe(
+                time.monotonic() - connected_at
+            )
+
+        self._metrics_python_connected_at = None
+        super().close()
+
+    def make_debug_cursor(self, cursor: Any) -> Any:
+        return MetricsCursorDebugWrapper(cursor, self)
+
+    def make_cursor(self, cursor: Any) -> Any:
+        return MetricsCursorWrapper(cursor, self)
+
+
+class PoolStatsCollector(Collector):
+    """
+    Export the size of the psycopg connection pools used by Django, pools
+    are created per alias when the pool option is set in the database
+    settings.
+    """
+
+    def collect(self) -> Iterable[Metric]:
+        size = GaugeMetricFamily(
+            f"{NAMESPACE}_django_database_pool_size",
+            "Number of connections managed by the connection pool.",
+            labels=["db"],
+        )
+        idle = GaugeMetricFamily(
+            f"{NAMESPACE}_django_database_pool_idle",
+            "Number of idle connections in the connection pool.",
+            labels=["db"],
+        )
+        in_use = GaugeMetricFamily(
+            f"{NAMESPACE}_django_database_pool_in_use",
+            "Number of connections checked out from the connection pool.",
+            labels=["db"],
+        )
+        waiting = GaugeMetricFamily(
+            f"{NAMESPACE}_django_database_pool_requests_waiting",
+            "Number of requests waiting for a connection from the connection pool.",
+            labels=["db"],
+        )
+
+        # Connection pooling is supported from Django 5.1.
+        pools = getattr(base.DatabaseWrapper, "_connection_pools", {})
+
+        for alias, pool in pools.items():
+            stats = pool.get_stats()
+            pool_size = stats.get("pool_size", 0)
+            pool_available = stats.get("pool_available", 0)
+
+            size.add_metric([alias], pool_size)
+            idle.add_metric([alias], pool_available)
+            in_use.add_metric([alias], pool_size - pool_available)
+            waiting.add_metric([alias], stats.get("requests_waiting", 0))
+
+        yield size
+        yield idle
+        yield in_use
+        yield waiting
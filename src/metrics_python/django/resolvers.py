@@ -0,0 +1,49 @@
+import time
+from functools import wraps
+from typing import Any
+
+from django.http import HttpRequest
+from prometheus_client import Histogram
+
+from ._metrics import URL_RESOLVE_DURATION
+from ._utils import get_view_name
+
+# The label children of the resolve duration by view name, the number of
+# views is bounded by the URLconf.
+_resolve_durations: dict[str, Histogram] = {}
+
+
+def _get_resolve_duration(view_name: str) -> Histogram:
+    resolve_duration = _resolve_durations.get(view_name)
+    if resolve_duration is None:
+        resolve_duration = URL_RESOLVE_DURATION.labels(view=view_name)
+        _resolve_durations[view_name] = resolve_duration
+
+    return resolve_duration
+
+
+def patch_url_resolvers() -> None:
+    """
+    Observe the time spent resolving the view of requests. The handler
+    resolves the root URL resolver once per request, nested resolvers used
+    by include() are part of the observed duration.
+    """
+
+    from django.core.handlers.base import BaseHandler
+
+    if hasattr(BaseHandler.resolve_request, "_metrics_python_is_patched"):
+        return
+
+    old_resolve_request = BaseHandler.resolve_request
+
+    @wraps(old_resolve_request)
+    def resolve_request(self: BaseHandler, request: HttpRequest) -> Any:
+        start = time.perf_counter()
+        try:
+            return old_resolve_request(self, request)
+        finally:
+            duration = time.perf_counter() - start
+            _get_resolve_duration(get_view_name(request)).observe(duration)
+
+    resolve_request._metrics_python_is_patched = True  # type: ignore
+    BaseHandler.resolve_request = resolve_request
@@ -4,6 +4,7 @@ from typing import Any, Callable
 from django import VERSION
 from django.dispatch import Signal
 
+from ._latency import enter_component, exit_component
 from ._metrics import SIGNAL_DURATION
 
 
@@ -45,8 +46,12 @@ def patch_signals() -> None:
             def wrapper(*args: Any, **kwargs: Any) -> Any:
                 signal = _get_receiver_name(receiver)
 
-                with SIGNAL_DURATION.labels(signal=signal).time():
-                    return receiver(*args, **kwargs)
+                entered = enter_component("signals")
+                try:
+                    with SIGNAL_DURATION.labels(signal=signal).time():
+                        return receiver(*args, **kwargs)
+                finally:
+                    exit_component(entered)
 
             return wrapper
 
@@ -0,0 +1,162 @@
+import collections
+import random
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from logging import getLogger
+from typing import Any
+
+from django.utils import timezone
+
+from .conf import settings
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class SlowQueryPlan:
+    db: str
+    # Name of the view, task or command executing the query.
+    name: str | None
+    trace_id: str | None
+    sql: str
+    duration_seconds: float
+    plan: str
+    timestamp: datetime
+
+
+class SlowQueryPlans:
+    """
+    Bounded in-memory ring buffer with the most recent slow query plans.
+    """
+
+    def __init__(self, size: int | None = None) -> None:
+        self._size = size
+        self._lock = threading.Lock()
+        self._plans: collections.deque[SlowQueryPlan] = collections.deque()
+
+    @property
+    def size(self) -> int:
+        if self._size is None:
+            return settings.SLOW_QUERY_PLANS_SIZE
+
+        return self._size
+
+    def add(self, plan: SlowQueryPlan) -> None:
+        with self._lock:
+            self._plans.append(plan)
+
+            while len(self._plans) > self.size:
+                self._plans.popleft()
+
+    def get(self) -> list[SlowQueryPlan]:
+        with self._lock:
+            return list(self._plans)
+
+
+SLOW_QUERY_PLANS = SlowQueryPlans()
+
+
+def get_slow_query_plans() -> list[SlowQueryPlan]:
+    """
+    Return the most recent slow query plans captured by this process.
+    """
+
+    return SLOW_QUERY_PLANS.get()
+
+
+def _get_query_plan(connection: Any, sql: str, params: Any) -> str:
+    # A failing EXPLAIN should not break the transaction the slow query
+    # was executed in. savepoint() returns None in autocommit mode.
+    savepoint = connection.savepoint()
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+            rows = cursor.fetchall()
+    except Exception:
+        if savepoint:
+            connection.savepoint_rollback(savepoint)
+
+        raise
+
+    if savepoint:
+        connection.savepoint_commit(savepoint)
+
+    return "\n".join(
+        row if isinstance(row, str) else " ".join(str(column) for column in row)
+        for row in rows
+    )
+
+
+def _explain_query(
+    *,
+    connection: Any,
+    sql: Any,
+    params: Any,
+    duration_seconds: float,
+    name: str | None,
+    trace_id: str | None,
+) -> None:
+    if random.random() >= settings.EXPLAIN_SAMPLE_RATE:
+        return
+
+    # Composed SQL objects, like psycopg's sql.Composed, are only rendered
+    # by the database driver and are not explained.
+    if not isinstance(sql, str):
+        return
+
+    # Only read queries are explained, writes are left alone.
+    if not sql.lstrip()[:6].upper() == "SELECT":
+        return
+
+    plan = _get_query_plan(connection, sql, params)
+
+    SLOW_QUERY_PLANS.add(
+        SlowQueryPlan(
+            db=connection.alias,
+            name=name,
+            trace_id=trace_id,
+            sql=sql,
+            duration_seconds=duration_seconds,
+            plan=plan,
+            timestamp=timezone.now(),
+        )
+    )
+
+    logger.info(
+        "Slow query (%.3fs) in %s, trace id %s: %s\n%s",
+        duration_seconds,
+        name,
+        trace_id,
+        sql,
+        plan,
+    )
+
+
+def explain_query(
+    *,
+    connection: Any,
+    sql: Any,
+    params: Any,
+    duration_seconds: float,
+    name: str | None,
+    trace_id: str | None,
+) -> None:
+    """
+    Capture the plan of a sampled fraction of slow SELECT queries. The
+    slow query has already been executed, errors capturing its plan are
+    logged and never raised to the caller.
+    """
+
+    try:
+        _explain_query(
+            connection=connection,
+            sql=sql,
+            params=params,
+            duration_seconds=duration_seconds,
+            name=name,
+            trace_id=trace_id,
+        )
+    except Exception:
+        logger.debug("Unable to explain slow query.", exc_info=True)
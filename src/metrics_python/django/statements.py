@@ -0,0 +1,134 @@
+import threading
+from dataclasses import dataclass
+from typing import Iterable
+
+from prometheus_client.core import CounterMetricFamily, Metric
+from prometheus_client.registry import Collector
+
+from ..constants import NAMESPACE
+from .conf import settings
+
+# Statements are exported as label values, long statements are truncated
+# to keep the size of the exported metrics reasonable.
+MAX_STATEMENT_LENGTH = 200
+
+
+@dataclass
+class StatementStats:
+    db: str
+    fingerprint: str
+    statement: str
+    count: int
+    duration_seconds: float
+    # Upper bound of the duration over-estimated for the statement. Space-
+    # Saving assigns the weight of the evicted statement to the new one.
+    error_seconds: float
+
+
+class SpaceSaving:
+    """
+    Streaming top-K of SQL statements by database time, using the
+    Space-Saving algorithm. At most `capacity` statements are tracked.
+    When a new statement is seen and the table is full, the statement with
+    the least database time is replaced, and the new statement inherits
+    its database time as the error.
+    """
+
+    def __init__(self, capacity: int | None = None) -> None:
+        self._capacity = capacity
+        self._lock = threading.Lock()
+        self._entries: dict[tuple[str, str], StatementStats] = {}
+
+    @property
+    def capacity(self) -> int:
+        if self._capacity is None:
+            return settings.TOP_STATEMENTS_CAPACITY
+
+        return self._capacity
+
+    def add(
+        self,
+        *,
+        db: str,
+        fingerprint: str,
+        statement: str,
+        count: int,
+        duration_seconds: float,
+    ) -> None:
+        key = (db, fingerprint)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.count += count
+                entry.duration_seconds += duration_seconds
+                return
+
+            error_seconds = 0.0
+            if len(self._entries) >= self.capacity:
+                evicted_key = min(
+                    self._entries,
+                    key=lambda k: self._entries[k].duration_seconds,
+                )
+                error_seconds = self._entries.pop(evicted_key).duration_seconds
+
+            self._entries[key] = StatementStats(
+                db=db,
+                fingerprint=fingerprint,
+                statement=statement[:MAX_STATEMENT_LENGTH],
+                count=count,
+                duration_seconds=error_seconds + duration_seconds,
+                error_seconds=error_seconds,
+            )
+
+    def top(self) -> list[StatementStats]:
+        with self._lock:
+            entries = list(self._entries.values())
+
+        return sorted(entries, key=lambda e: e.duration_seconds, reverse=True)
+
+
+# Process-wide top statements, updated by the query counter when
+# METRICS_PYTHON_TRACK_TOP_STATEMENTS is enabled.
+TOP_STATEMENTS = SpaceSaving()
+
+
+class TopStatementsCollector(Collector):
+    """
+    Export the database time and execution count of the heaviest SQL
+    statements in this process. The number of exported series is bounded
+    by METRICS_PYTHON_TOP_STATEMENTS_CAPACITY.
+
+    The tracker is kept in memory per process, in multiprocess mode only
+    the statements executed by the process serving metrics are exported.
+    """
+
+    def collect(self) -> Iterable[Metric]:
+        labels = ["db", "fingerprint", "statement"]
+
+        duration = CounterMetricFamily(
+            f"{NAMESPACE}_django_top_statement_duration_seconds",
+            "Database time spent on the heaviest SQL statements.",
+            labels=labels,
+        )
+        count = CounterMetricFamily(
+            f"{NAMESPACE}_django_top_statement_count",
+            "Number of executions of the heaviest SQL statements.",
+            labels=labels,
+        )
+        error = CounterMetricFamily(
+            f"{NAMESPACE}_django_top_statement_error_seconds",
+            "Upper bound of the over-estimated database time of the heaviest "
+            "SQL statements.",
+            labels=labels,
+        )
+
+        for entry in TOP_STATEMENTS.top():
+            label_values = [entry.db, entry.fingerprint, entry.statement]
+            duration.add_metric(label_values, entry.duration_seconds)
+            count.add_metric(label_values, entry.count)
+            error.add_metric(label_values, entry.error_seconds)
+
+        yield duration
+        yield count
+        yield error
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path("", views.index, name="index"),
+    path("slow/", views.slow, name="slow"),
+    path("duplicates/", views.duplicates, name="duplicates"),
+]
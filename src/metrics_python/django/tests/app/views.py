@@ -0,0 +1,25 @@
+import time
+
+from django.db import connection
+from django.http import HttpRequest, HttpResponse
+
+
+def index(request: HttpRequest) -> HttpResponse:
+    return HttpResponse("ok")
+
+
+def slow(request: HttpRequest) -> HttpResponse:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+    time.sleep(0.02)
+
+    return HttpResponse("ok")
+
+
+def duplicates(request: HttpRequest) -> HttpResponse:
+    for _ in range(3):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+
+    return HttpResponse("ok")
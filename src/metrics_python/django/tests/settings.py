@@ -1 +1,14 @@
 INSTALLED_APPS = ["metrics_python.django.tests.app"]
+
+ROOT_URLCONF = "metrics_python.django.tests.app.urls"
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+    },
+    "other": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+    },
+}
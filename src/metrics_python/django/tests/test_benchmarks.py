@@ -0,0 +1,445 @@
+import asyncio
+import contextlib
+import inspect
+import io
+import json
+import os
+import time
+from typing import Any, Callable, Generator
+
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+from django.middleware.clickjacking import XFrameOptionsMiddleware
+from django.middleware.common import CommonMiddleware
+from django.middleware.csrf import CsrfViewMiddleware
+from django.middleware.gzip import GZipMiddleware
+from django.middleware.http import ConditionalGetMiddleware
+from django.middleware.security import SecurityMiddleware
+from django.test import RequestFactory
+from django.utils.deprecation import MiddlewareMixin
+
+from metrics_python.django._metrics import MIDDLEWARE_DURATION
+from metrics_python.django._query_counter import QueryCounter
+from metrics_python.django.cache import METHODS_TO_INSTRUMENT, _patch_cache
+from metrics_python.django.middleware import _get_response_duration, _wrap_middleware
+
+pytestmark = [
+    pytest.mark.benchmark,
+    pytest.mark.skipif(
+        not os.environ.get("METRICS_PYTHON_BENCHMARK"),
+        reason="Benchmarks are only executed when METRICS_PYTHON_BENCHMARK is set.",
+    ),
+]
+
+
+class FakeConnection:
+    alias = "default"
+
+
+def _execute(sql: Any, params: Any, many: Any, context: Any) -> None:
+    return None
+
+
+def _per_query_overhead_seconds(query_count: int) -> float:
+    """
+    Execute query_count distinct queries through a query counter and
+    return the average time spent per query.
+    """
+
+    counter = QueryCounter()
+    context = {"connection": FakeConnection()}
+
+    start = time.perf_counter()
+    for i in range(query_count):
+        counter(_execute, f"SELECT * FROM table_{i}", None, False, context)
+    duration = time.perf_counter() - start
+
+    # Every query is a distinct call site, the index is not capped.
+    assert len(counter.call_sites) == query_count
+
+    return duration / query_count
+
+
+def test_duplicate_detection_overhead_is_flat(settings: Any) -> None:
+    # The call sites of the largest run fit in the index, lookups of a capped
+    # index would not measure its growth.
+    settings.METRICS_PYTHON_DUPLICATE_QUERIES_MAX_CALL_SITES = 10_000
+
+    small = min(_per_query_overhead_seconds(200) for _ in range(5))
+    large = min(_per_query_overhead_seconds(5_000) for _ in range(5))
+
+    print(
+        f"\nPer-query overhead: {small * 10**6:.2f}us (200 queries), "
+        f"{large * 10**6:.2f}us (5000 queries)"
+    )
+
+    # Looking up previously seen queries should not depend on the number
+    # of queries executed so far.
+    assert large < small * 3
+
+
+# Query counter configurations, as overrides of the Django settings. None
+# executes the queries without a query counter.
+COUNTER_CONFIGURATIONS: dict[str, dict[str, Any] | None] = {
+    "no_counter": None,
+    "duplicates_off": {
+        "METRICS_PYTHON_OBSERVE_DUPLICATE_QUERIES": False,
+        "METRICS_PYTHON_PRINT_DUPLICATE_QUERIES": False,
+    },
+    "duplicates_on": {
+        "METRICS_PYTHON_OBSERVE_DUPLICATE_QUERIES": True,
+        "METRICS_PYTHON_PRINT_DUPLICATE_QUERIES": False,
+    },
+    "printing_on": {
+        "METRICS_PYTHON_OBSERVE_DUPLICATE_QUERIES": True,
+        "METRICS_PYTHON_PRINT_DUPLICATE_QUERIES": True,
+    },
+}
+
+REPETITIONS = 3
+
+
+@pytest.fixture(scope="module")
+def benchmark_results() -> Generator[list[dict[str, Any]], None, None]:
+    """
+    Collect the benchmark results, written as JSON to the path in
+    METRICS_PYTHON_BENCHMARK_OUTPUT when the module is done.
+    """
+
+    results: list[dict[str, Any]] = []
+    yield results
+
+    output = os.environ.get("METRICS_PYTHON_BENCHMARK_OUTPUT")
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+def _request(aliases: list[str], query_count: int, use_counter: bool) -> float:
+    """
+    Execute query_count queries spread over the aliases, like a request
+    would, and return the duration.
+    """
+
+    cursors = [connections[alias].cursor() for alias in aliases]
+
+    start = time.perf_counter()
+    with QueryCounter.create_counter() if use_counter else contextlib.nullcontext():
+        for i in range(query_count):
+            cursors[i % len(cursors)].execute("SELECT %s", [i])
+    duration = time.perf_counter() - start
+
+    for cursor in cursors:
+        cursor.close()
+
+    return duration
+
+
+@pytest.mark.django_db(databases=["default", "other"])
+@pytest.mark.parametrize("alias_count", [1, 2])
+@pytest.mark.parametrize("query_count", [10, 100, 1_000, 10_000])
+def test_query_counter_overhead(
+    settings: Any,
+    benchmark_results: list[dict[str, Any]],
+    query_count: int,
+    alias_count: int,
+) -> None:
+    aliases = ["default", "other"][:alias_count]
+    durations: dict[str, float] = {}
+
+    for configuration, overrides in COUNTER_CONFIGURATIONS.items():
+        for name, value in (overrides or {}).items():
+            setattr(settings, name, value)
+
+        # Printed duplicate queries are part of the cost, but not of the
+        # benchmark output.
+        with contextlib.redirect_stdout(io.StringIO()):
+            durations[configuration] = min(
+                _request(aliases, query_count, overrides is not None)
+                for _ in range(REPETITIONS)
+            )
+
+    baseline = durations["no_counter"]
+
+    print(f"\n{query_count} queries, {alias_count} aliases:")
+    for configuration, duration in durations.items():
+        per_query_overhead = (duration - baseline) / query_count
+
+        print(
+            f"  {configuration:<16} {duration * 10**3:9.2f}ms per request, "
+            f"{per_query_overhead * 10**6:7.2f}us overhead per query"
+        )
+
+        benchmark_results.append(
+            {
+                "benchmark": "query_counter",
+                "configuration": configuration,
+                "query_count": query_count,
+                "alias_count": alias_count,
+                "request_duration_seconds": duration,
+                "request_overhead_seconds": duration - baseline,
+                "per_query_overhead_seconds": per_query_overhead,
+            }
+        )
+
+
+class NoopMixinMiddleware(MiddlewareMixin):
+    def process_request(self, request: HttpRequest) -> None:
+        return None
+
+    def process_response(
+        self, request: HttpRequest, response: HttpResponse
+    ) -> HttpResponse:
+        return response
+
+
+class NoopMiddleware:
+    def __init__(self, get_response: Any) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        return self.get_response(request)
+
+
+# A stack of 20 middlewares, Django middlewares commonly found in projects
+# and no-op middlewares of both styles.
+MIDDLEWARE_STACK: list[Any] = [
+    SecurityMiddleware,
+    CommonMiddleware,
+    CsrfViewMiddleware,
+    XFrameOptionsMiddleware,
+    ConditionalGetMiddleware,
+    GZipMiddleware,
+] + [NoopMixinMiddleware, NoopMiddleware] * 7
+
+
+def _view(request: HttpRequest) -> HttpResponse:
+    return HttpResponse("ok")
+
+
+def _wrap_middleware_per_call_timer(middleware: Any, middleware_name: str) -> Any:
+    """
+    The middleware wrapper before the timing was moved to load time, the
+    reference of the overhead reduction. Every call checks the mode of the
+    middleware, enters a generator-based timer and resolves the histogram
+    label children. Only the sync call path used by the benchmark is kept.
+    """
+
+    @contextlib.contextmanager
+    def _middleware_timer(method: Any) -> Generator[None, None, None]:
+        method_name = getattr(method, "__name__", None) or "<unnamed method>"
+
+        token = _get_response_duration.set(0.0)
+        try:
+            start = time.perf_counter()
+
+            yield
+
+            duration = max(
+                time.perf_counter() - start - _get_response_duration.get(), 0
+            )
+        finally:
+            _get_response_duration.reset(token)
+
+        MIDDLEWARE_DURATION.labels(
+            middleware=middleware_name, method=method_name
+        ).observe(duration)
+
+    def _get_wrapped_get_response(get_response: Any) -> Any:
+        @contextlib.contextmanager
+        def _get_response_timer() -> Generator[None, None, None]:
+            start = time.perf_counter()
+
+            yield
+
+            _get_response_duration.set(
+                _get_response_duration.get() + time.perf_counter() - start
+            )
+
+        def _get_response(*args: Any, **kwargs: Any) -> Any:
+            with _get_response_timer():
+                return get_response(*args, **kwargs)
+
+        return _get_response
+
+    class PerCallTimerMiddleware:
+        def __init__(self, get_response: Any) -> None:
+            self._inner = middleware(_get_wrapped_get_response(get_response))
+            self.get_response = get_response
+            self._call_method: Any = None
+
+        def __call__(self, *args: Any, **kwargs: Any) -> Any:
+            # The mode of the middleware was checked on every call.
+            if asyncio.iscoroutinefunction(self.get_response):
+                raise NotImplementedError()
+
+            f = self._call_method
+            if f is None:
+                self._call_method = f = self._inner.__call__
+
+            with _middleware_timer(f):
+                return f(*args, **kwargs)
+
+    return PerCallTimerMiddleware
+
+
+def _build_middleware_chain(wrapper: Callable[[Any, str], Any] | None) -> Any:
+    handler: Any = _view
+    for middleware in reversed(MIDDLEWARE_STACK):
+        if wrapper is not None:
+            handler = wrapper(middleware, middleware.__name__)(handler)
+        else:
+            handler = middleware(handler)
+
+    return handler
+
+
+def _per_request_duration_seconds(handler: Any, request_count: int) -> float:
+    request = RequestFactory().get("/")
+
+    start = time.perf_counter()
+    for _ in range(request_count):
+        handler(request)
+    duration = time.perf_counter() - start
+
+    return duration / request_count
+
+
+@pytest.mark.parametrize("sample_rate", [1.0, 0.1])
+def test_middleware_overhead(
+    settings: Any, benchmark_results: list[dict[str, Any]], sample_rate: float
+) -> None:
+    settings.METRICS_PYTHON_MIDDLEWARE_SAMPLE_RATE = sample_rate
+
+    baseline = min(
+        _per_request_duration_seconds(_build_middleware_chain(None), 2_000)
+        for _ in range(REPETITIONS)
+    )
+    wrapped = min(
+        _per_request_duration_seconds(_build_middleware_chain(_wrap_middleware), 2_000)
+        for _ in range(REPETITIONS)
+    )
+
+    print(
+        f"\n{len(MIDDLEWARE_STACK)} middlewares, sample rate {sample_rate}: "
+        f"{baseline * 10**6:.2f}us per request unwrapped, "
+        f"{(wrapped - baseline) * 10**6:.2f}us overhead per request"
+    )
+
+    benchmark_results.append(
+        {
+            "benchmark": "middleware",
+            "middleware_count": len(MIDDLEWARE_STACK),
+            "sample_rate": sample_rate,
+            "request_duration_seconds": wrapped,
+            "request_overhead_seconds": wrapped - baseline,
+        }
+    )
+
+
+def test_middleware_overhead_reduction(
+    settings: Any, benchmark_results: list[dict[str, Any]]
+) -> None:
+    settings.METRICS_PYTHON_MIDDLEWARE_SAMPLE_RATE = 1.0
+
+    baseline = min(
+        _per_request_duration_seconds(_build_middleware_chain(None), 2_000)
+        for _ in range(REPETITIONS)
+    )
+
+    def overhead(wrapper: Callable[[Any, str], Any]) -> float:
+        wrapped = min(
+            _per_request_duration_seconds(_build_middleware_chain(wrapper), 2_000)
+            for _ in range(REPETITIONS)
+        )
+
+        return wrapped - baseline
+
+    per_call_timer = overhead(_wrap_middleware_per_call_timer)
+    current = overhead(_wrap_middleware)
+
+    print(
+        f"\n{len(MIDDLEWARE_STACK)} middlewares: "
+        f"{per_call_timer * 10**6:.2f}us overhead per request with per-call "
+        f"timers, {current * 10**6:.2f}us with timers resolved at load time"
+    )
+
+    benchmark_results.append(
+        {
+            "benchmark": "middleware_overhead_reduction",
+            "middleware_count": len(MIDDLEWARE_STACK),
+            "per_call_timer_overhead_seconds": per_call_timer,
+            "request_overhead_seconds": current,
+        }
+    )
+
+    # Timers resolved at load time cost about half of the per-call timers,
+    # the bound leaves room for noise of shared machines.
+    assert current < per_call_timer * 0.75
+
+
+class UnpatchedLocMemCache(LocMemCache):
+    """
+    LocMemCache with the methods of the backend before they are patched,
+    the baseline of the cache benchmark.
+    """
+
+
+for _method_name in METHODS_TO_INSTRUMENT:
+    setattr(
+        UnpatchedLocMemCache,
+        _method_name,
+        inspect.unwrap(getattr(LocMemCache, _method_name)),
+    )
+
+
+CACHE_CALLS: dict[str, Callable[[Any], Any]] = {
+    "get_hit": lambda cache: cache.get("hit"),
+    "get_miss": lambda cache: cache.get("miss"),
+    "set": lambda cache: cache.set("key", "value"),
+}
+
+
+def _per_call_duration_seconds(
+    cache: Any, call: Callable[[Any], Any], call_count: int
+) -> float:
+    cache.set("hit", "value")
+
+    start = time.perf_counter()
+    for _ in range(call_count):
+        call(cache)
+    duration = time.perf_counter() - start
+
+    return duration / call_count
+
+
+@pytest.mark.parametrize("call", list(CACHE_CALLS))
+def test_cache_overhead(benchmark_results: list[dict[str, Any]], call: str) -> None:
+    observed = LocMemCache("benchmark-observed", {})
+    _patch_cache(observed, "benchmark")
+    unobserved = UnpatchedLocMemCache("benchmark-unobserved", {})
+
+    baseline = min(
+        _per_call_duration_seconds(unobserved, CACHE_CALLS[call], 20_000)
+        for _ in range(REPETITIONS)
+    )
+    patched = min(
+        _per_call_duration_seconds(observed, CACHE_CALLS[call], 20_000)
+        for _ in range(REPETITIONS)
+    )
+
+    print(
+        f"\nLocMemCache {call}: {baseline * 10**6:.2f}us per call unpatched, "
+        f"{(patched - baseline) * 10**6:.2f}us overhead per call"
+    )
+
+    benchmark_results.append(
+        {
+            "benchmark": "cache",
+            "call": call,
+            "call_duration_seconds": patched,
+            "call_overhead_seconds": patched - baseline,
+        }
+    )
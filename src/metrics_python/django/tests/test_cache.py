@@ -1,6 +1,22 @@
+from typing import Any
+
+from asgiref.sync import async_to_sync
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisSerializer
 from prometheus_client import REGISTRY
+from pytest_mock import MockerFixture
 
-from metrics_python.django.cache import patch_caching
+from metrics_python.django._cache_keys import (
+    KeyPrefixes,
+    _create_key_prefixes,
+    get_key_prefix,
+)
+from metrics_python.django.cache import (
+    _get_payload_size,
+    _patch_cache,
+    _patch_redis_serializer,
+    patch_caching,
+)
 
 
 def test_patch_cache() -> None:
@@ -8,7 +24,12 @@ def test_patch_cache() -> None:
     patch_caching()
     patch_caching()
 
-    from django.core.cache import cache
+    from django.core.cache import cache, caches
+
+    # The default cache is created by the test database setup
+    # (createcachetable), before the cache handler is patched.
+    if caches.all(initialized_only=True):
+        del caches["default"]
 
     cache.set("test", "value")
     cache.get("test")
@@ -45,3 +66,311 @@ def test_patch_cache() -> None:
         )
         == 1.0
     )
+
+
+def _get_call_count(alias: str, method: str) -> float:
+    return (
+        REGISTRY.get_sample_value(
+            "metrics_python_django_cache_call_duration_seconds_count",
+            {"alias": alias, "method": method},
+        )
+        or 0.0
+    )
+
+
+def test_patch_cache_class() -> None:
+    first = LocMemCache("first", {})
+    second = LocMemCache("second", {})
+    unobserved = LocMemCache("unobserved", {})
+
+    _patch_cache(first, "first")
+    _patch_cache(second, "second")
+    _patch_cache(second, "second")
+
+    # The backend class is patched once, instances keep their own labels.
+    assert LocMemCache.__dict__["get"]._metrics_python_is_patched
+
+    first.get("key")
+    second.get("key")
+    second.get("key")
+    unobserved.get("key")
+
+    assert _get_call_count("first", "get") == 1.0
+    assert _get_call_count("second", "get") == 2.0
+    assert _get_call_count("unobserved", "get") == 0.0
+
+
+def test_patch_cache_async() -> None:
+    cache = LocMemCache("async", {})
+    _patch_cache(cache, "async")
+
+    async def calls() -> None:
+        await cache.aset("key", "value")
+        assert await cache.aget("key") == "value"
+        assert await cache.aget_many(["key", "unknown"]) == {"key": "value"}
+
+    async_to_sync(calls)()
+
+    assert _get_call_count("async", "aset") == 1.0
+    assert _get_call_count("async", "aget") == 1.0
+    assert _get_call_count("async", "aget_many") == 1.0
+
+    # The sync methods executed by the async methods are not observed.
+    assert _get_call_count("async", "set") == 0.0
+    assert _get_call_count("async", "get") == 0.0
+
+    assert (
+        REGISTRY.get_sample_value(
+            "metrics_python_django_cache_call_executor_wait_duration_seconds_count",
+            {"alias": "async", "method": "aget"},
+        )
+        == 1.0
+    )
+
+
+def _get_sample(name: str, alias: str, method: str) -> float:
+    return (
+        REGISTRY.get_sample_value(
+            f"metrics_python_django_{name}", {"alias": alias, "method": method}
+        )
+        or 0.0
+    )
+
+
+def test_patch_cache_bulk_calls() -> None:
+    cache = LocMemCache("bulk", {})
+    _patch_cache(cache, "bulk")
+
+    cache.set_many({"a": 1, "b": 2, "c": 3})
+    assert cache.get_many(key for key in ["a", "b", "d", "e"]) == {"a": 1, "b": 2}
+    assert cache.get_many(keys=["d"]) == {}
+    cache.delete_many(["a", "b"])
+
+    assert _get_sample("cache_call_keys_requested_count_total", "bulk", "get_many") == 5
+    assert _get_sample("cache_call_keys_returned_count_total", "bulk", "get_many") == 2
+    assert _get_sample("cache_call_hit_ratio_sum", "bulk", "get_many") == 0.5
+
+    for method, batch_size in (("set_many", 3), ("delete_many", 2)):
+        assert _get_sample("cache_call_batch_size_count", "bulk", method) == 1
+        assert _get_sample("cache_call_batch_size_sum", "bulk", method) == batch_size
+
+    # A bulk get returning none of the keys is a miss.
+    assert (
+        REGISTRY.get_sample_value(
+            "metrics_python_django_cache_call_gets_duration_seconds_count",
+            {"alias": "bulk", "method": "get_many", "hit": "False"},
+        )
+        == 1.0
+    )
+
+
+def test_key_prefixes() -> None:
+    key_prefixes = KeyPrefixes(get_key_prefix, max_count=2)
+
+    assert key_prefixes.get("user:1") == "user"
+    assert key_prefixes.get("session:abc:def") == "session"
+    assert key_prefixes.get("page:1") == "other"
+    assert key_prefixes.get("user:2") == "user"
+
+    assert get_key_prefix("unprefixed") == "<none>"
+
+
+def _first_character(key: str) -> str:
+    return key[0]
+
+
+def test_patch_cache_key_prefixes(settings: Any) -> None:
+    settings.METRICS_PYTHON_OBSERVE_CACHE_KEY_PREFIXES = True
+    settings.METRICS_PYTHON_ESTIMATE_CACHE_PAYLOAD_SIZE = True
+    settings.METRICS_PYTHON_CACHE_KEY_PREFIX_EXTRACTOR = (
+        "metrics_python.django.tests.test_cache._first_character"
+    )
+    _create_key_prefixes.cache_clear()
+
+    try:
+        cache = LocMemCache("prefixes", {})
+        _patch_cache(cache, "prefixes")
+    finally:
+        _create_key_prefixes.cache_clear()
+
+    cache.set("user:1", "a" * 100)
+    cache.get("user:1")
+    cache.get("user:2")
+    cache.get_many(["user:1", "page:1"])
+
+    def sample(name: str, **labels: str) -> float:
+        return (
+            REGISTRY.get_sample_value(
+                f"metrics_python_django_cache_key_prefix_{name}",
+                {"alias": "prefixes", **labels},
+            )
+            or 0.0
+        )
+
+    assert sample("gets_count_total", method="get", prefix="u", hit="True") == 1
+    assert sample("gets_count_total", method="get", prefix="u", hit="False") == 1
+    assert sample("gets_count_total", method="get_many", prefix="p", hit="False") == 1
+    assert sample("call_duration_seconds_count", method="get_many", prefix="u") == 1
+    assert sample("call_duration_seconds_count", method="get_many", prefix="p") == 1
+    assert sample("payload_size_bytes_count", method="set", prefix="u") == 1
+    assert sample("payload_size_bytes_sum", method="set", prefix="u") > 100
+
+
+def _failing_extractor(key: str) -> str:
+    if key.startswith("bad"):
+        raise ValueError(key)
+
+    return key[0]
+
+
+def test_key_prefixes_failing_extractor() -> None:
+    key_prefixes = KeyPrefixes(_failing_extractor, max_count=1)
+
+    assert key_prefixes.get("bad:1") == "unknown"
+    assert key_prefixes.get("user:1") == "u"
+
+
+def test_patch_cache_key_prefixes_failing_extractor(settings: Any) -> None:
+    settings.METRICS_PYTHON_OBSERVE_CACHE_KEY_PREFIXES = True
+    settings.METRICS_PYTHON_CACHE_KEY_PREFIX_EXTRACTOR = _failing_extractor
+    _create_key_prefixes.cache_clear()
+
+    try:
+        cache = LocMemCache("prefixes_failing", {})
+        _patch_cache(cache, "prefixes_failing")
+    finally:
+        _create_key_prefixes.cache_clear()
+
+    cache.set("bad:1", "a" * 100)
+    assert cache.get("bad:1") == "a" * 100
+
+    def sample(name: str, **labels: str) -> float:
+        return (
+            REGISTRY.get_sample_value(
+                f"metrics_python_django_cache_key_prefix_{name}",
+                {"alias": "prefixes_failing", "prefix": "unknown", **labels},
+            )
+            or 0.0
+        )
+
+    assert sample("call_duration_seconds_count", method="set") == 1
+    assert sample("gets_count_total", method="get", hit="True") == 1
+
+    # Payload sizes are not estimated, values are not pickled again.
+    assert sample("payload_size_bytes_count", method="set") == 0
+
+
+class SerializingCache(LocMemCache):
+    """
+    A cache serializing values with the serializer of the Redis backend.
+    """
+
+    serializer = RedisSerializer()
+
+    def set(self, key: Any, value: Any, *args: Any, **kwargs: Any) -> None:
+        super().set(key, self.serializer.dumps(value), *args, **kwargs)
+
+    def get(self, key: Any, default: Any = None, version: Any = None) -> Any:
+        value = super().get(key, version=version)
+        if value is None:
+            return default
+
+        return self.serializer.loads(value)
+
+
+def test_patch_cache_serializer() -> None:
+    _patch_redis_serializer()
+    _patch_redis_serializer()
+
+    cache = SerializingCache("serializer", {})
+    _patch_cache(cache, "serializer")
+
+    cache.set("key", "a" * 1000)
+    assert cache.get("key") == "a" * 1000
+    cache.get("unknown")
+
+    for method in ("set", "get"):
+        assert (
+            _get_sample("cache_call_payload_size_bytes_count", "serializer", method)
+            == 1
+        )
+        assert (
+            _get_sample("cache_call_payload_size_bytes_sum", "serializer", method)
+            > 1000
+        )
+        assert (
+            _get_sample(
+                "cache_call_serialization_duration_seconds_count", "serializer", method
+            )
+            == 1
+        )
+
+
+def test_patch_cache_estimated_payload_size(settings: Any) -> None:
+    settings.METRICS_PYTHON_ESTIMATE_CACHE_PAYLOAD_SIZE = True
+
+    cache = LocMemCache("estimated", {})
+    _patch_cache(cache, "estimated")
+
+    cache.set_many({"a": b"x" * 100, "b": b"y" * 50})
+    cache.get("a")
+    cache.get("unknown")
+
+    assert (
+        _get_sample("cache_call_payload_size_bytes_sum", "estimated", "set_many") == 150
+    )
+    assert _get_sample("cache_call_payload_size_bytes_count", "estimated", "get") == 1
+    assert _get_sample("cache_call_payload_size_bytes_sum", "estimated", "get") == 100
+    assert (
+        _get_sample(
+            "cache_call_serialization_duration_seconds_count", "estimated", "get"
+        )
+        == 0
+    )
+
+
+class Unpicklable:
+    def __reduce__(self) -> Any:
+        raise RuntimeError("not picklable")
+
+
+def test_get_payload_size() -> None:
+    assert _get_payload_size(b"x" * 10) == 10
+    assert _get_payload_size(Unpicklable()) is None
+
+
+def test_patch_cache_key_prefixes_serializer(
+    settings: Any, mocker: MockerFixture
+) -> None:
+    settings.METRICS_PYTHON_OBSERVE_CACHE_KEY_PREFIXES = True
+    _create_key_prefixes.cache_clear()
+    _patch_redis_serializer()
+
+    try:
+        cache = SerializingCache("prefixes_serializer", {})
+        _patch_cache(cache, "prefixes_serializer")
+    finally:
+        _create_key_prefixes.cache_clear()
+
+    # The size measured by the serializer is reused, values are not pickled
+    # again.
+    get_payload_size = mocker.patch(
+        "metrics_python.django.cache._get_payload_size", return_value=None
+    )
+
+    cache.set("user:1", "a" * 1000)
+    cache.get("user:1")
+
+    get_payload_size.assert_not_called()
+
+    for method in ("set", "get"):
+        labels = {"alias": "prefixes_serializer", "method": method, "prefix": "user"}
+        assert (
+            REGISTRY.get_sample_value(
+                "metrics_python_django_cache_key_prefix_payload_size_bytes_sum", labels
+            )
+            == _get_sample(
+                "cache_call_payload_size_bytes_sum", "prefixes_serializer", method
+            )
+            > 1000
+        )
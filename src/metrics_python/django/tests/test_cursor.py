@@ -0,0 +1,58 @@
+from typing import Any
+
+import pytest
+from django.db import connection
+from pytest_mock import MockerFixture
+
+from metrics_python.django._cursor import MetricsCursorWrapper, _get_rows_size
+from metrics_python.django._query_counter import QueryCounter
+
+
+def test_get_rows_size() -> None:
+    assert _get_rows_size([]) == 0
+    assert _get_rows_size([("abc", b"de", 1, None)]) == 13
+
+    # The size is estimated from the first row.
+    assert _get_rows_size([("abc", b"de", 1, None), ("f", 2.5, None, None)]) == 26
+
+
+@pytest.fixture
+def metrics_cursor(mocker: MockerFixture) -> None:
+    mocker.patch.object(
+        connection,
+        "make_cursor",
+        lambda cursor: MetricsCursorWrapper(cursor, connection),
+    )
+
+
+def _select_rows(count: int) -> str:
+    return " UNION ALL ".join(f"SELECT {i}, 'row'" for i in range(count))
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "fetch",
+    [
+        lambda cursor: cursor.fetchall(),
+        lambda cursor: cursor.fetchmany(2) + cursor.fetchmany(2) + cursor.fetchmany(2),
+        lambda cursor: list(cursor),  # noqa: PLW0108
+        lambda cursor: [cursor.fetchone() for _ in range(6)],
+    ],
+)
+def test_metrics_cursor_observes_fetched_rows(metrics_cursor: None, fetch: Any) -> None:
+    with QueryCounter.create_counter() as counter:
+        with connection.cursor() as cursor:
+            cursor.execute(_select_rows(5))
+            fetch(cursor)
+
+    assert counter.get_total_query_count() == 1
+    assert counter.get_total_fetch_row_count_by_alias() == {"default": 5}
+    assert counter.get_total_fetch_size_by_alias() == {"default": 5 * (8 + 3)}
+    assert counter.get_total_fetch_duration_seconds_by_alias()["default"] > 0
+
+
+@pytest.mark.django_db
+def test_metrics_cursor_without_counter(metrics_cursor: None) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(_select_rows(2))
+        assert cursor.fetchall() == [(0, "row"), (1, "row")]
@@ -0,0 +1,81 @@
+import time
+from typing import Any
+
+import pytest
+from django.test import Client
+from prometheus_client import REGISTRY
+
+from metrics_python.django._latency import (
+    LatencyBreakdown,
+    enter_component,
+    exit_component,
+    start_request,
+)
+
+
+def test_latency_breakdown_exclusive_time() -> None:
+    # Components are not timed outside of requests.
+    assert enter_component("view") is None
+
+    breakdown = LatencyBreakdown()
+    start = time.perf_counter()
+    request = start_request(breakdown)
+
+    view = enter_component("view")
+    time.sleep(0.01)
+    db = enter_component("db")
+    time.sleep(0.02)
+    exit_component(db)
+    exit_component(view)
+
+    exit_component(request)
+    duration = time.perf_counter() - start
+
+    assert breakdown.durations["view"] >= 0.01
+    assert breakdown.durations["db"] >= 0.02
+    # Time is exclusive, the time spent in the query is not added to the
+    # view, so the components add up to the request duration.
+    assert sum(breakdown.durations.values()) <= duration
+
+
+def _get_component_duration(component: str) -> tuple[float, float]:
+    labels = {"method": "GET", "view": "slow", "status": "200", "component": component}
+    count = REGISTRY.get_sample_value(
+        "metrics_python_django_view_component_duration_seconds_count", labels
+    )
+    duration = REGISTRY.get_sample_value(
+        "metrics_python_django_view_component_duration_seconds_sum", labels
+    )
+
+    return count or 0.0, duration or 0.0
+
+
+@pytest.mark.django_db
+def test_latency_breakdown_middleware(settings: Any) -> None:
+    settings.MIDDLEWARE = [
+        "metrics_python.django.middleware.LatencyBreakdownMiddleware",
+    ]
+
+    before = {
+        component: _get_component_duration(component)
+        for component in ("view", "db", "cache")
+    }
+
+    response = Client().get("/slow/")
+    assert response.status_code == 200
+
+    after = {
+        component: _get_component_duration(component)
+        for component in ("view", "db", "cache")
+    }
+
+    # Every component is observed once per request.
+    for component in after:
+        assert after[component][0] - before[component][0] == 1
+
+    view_duration = after["view"][1] - before["view"][1]
+    db_duration = after["db"][1] - before["db"][1]
+
+    assert view_duration >= 0.02
+    assert 0 < db_duration < view_duration
+    assert after["cache"][1] == before["cache"][1]
@@ -0,0 +1,276 @@
+import asyncio
+import io
+from typing import Any, AsyncIterator, Iterator, cast
+
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import connections
+from django.http import FileResponse, HttpRequest, HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory
+from prometheus_client import REGISTRY
+from pytest_mock import MockerFixture
+
+from metrics_python.django._query_counter import QueryCounter
+from metrics_python.django.middleware import QueryCountMiddleware, _wrap_middleware
+
+
+def _execute_sql(sql: str) -> None:
+    with connections["default"].cursor() as cursor:
+        cursor.execute(sql)
+
+
+def _get_view_query_count(labels: dict[str, str]) -> float:
+    return (
+        REGISTRY.get_sample_value(
+            "metrics_python_django_view_query_count_total", labels
+        )
+        or 0.0
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_query_count_middleware_async() -> None:
+    async def get_response(request: HttpRequest) -> HttpResponse:
+        # Queries executed in the thread-sensitive executor and concurrently
+        # in other executor threads are observed.
+        await sync_to_async(_execute_sql)("SELECT 1")
+        await asyncio.gather(
+            *[
+                sync_to_async(_execute_sql, thread_sensitive=False)("SELECT 2")
+                for _ in range(4)
+            ]
+        )
+
+        return HttpResponse(status=201)
+
+    labels = {
+        "db": "default",
+        "method": "GET",
+        "view": "<unnamed view>",
+        "status": "201",
+    }
+    before = _get_view_query_count(labels)
+
+    middleware = QueryCountMiddleware(get_response)
+    response = async_to_sync(middleware)(RequestFactory().get("/"))
+
+    assert response.status_code == 201
+    assert _get_view_query_count(labels) - before == 5.0
+
+
+class SleepMiddleware:
+    async_capable = True
+    sync_capable = False
+    delay = 0.0
+
+    def __init__(self, get_response: Any) -> None:
+        self.get_response = get_response
+
+    async def __call__(self, request: HttpRequest) -> HttpResponse:
+        # Other requests are served while this middleware is processing the
+        # request and the response.
+        await asyncio.sleep(self.delay)
+        response = await self.get_response(request)
+        await asyncio.sleep(self.delay)
+
+        return response
+
+
+class OuterMiddleware(SleepMiddleware):
+    delay = 0.005
+
+
+class InnerMiddleware(SleepMiddleware):
+    delay = 0.025
+
+
+def _get_middleware_duration(middleware: str) -> float:
+    duration = 0.0
+    for metric in REGISTRY.collect():
+        for sample in metric.samples:
+            if (
+                sample.name == "metrics_python_django_middleware_duration_seconds_sum"
+                and sample.labels["middleware"] == middleware
+            ):
+                duration += sample.value
+
+    return duration
+
+
+def test_wrapped_middleware_concurrent_requests() -> None:
+    async def view(request: HttpRequest) -> HttpResponse:
+        return HttpResponse()
+
+    outer_name = "tests.OuterMiddleware"
+    inner_name = "tests.InnerMiddleware"
+
+    inner = _wrap_middleware(InnerMiddleware, inner_name)(view)
+    outer = _wrap_middleware(OuterMiddleware, outer_name)(inner)
+
+    outer_before = _get_middleware_duration(outer_name)
+    inner_before = _get_middleware_duration(inner_name)
+
+    async def requests() -> None:
+        await asyncio.gather(*[outer(RequestFactory().get("/")) for _ in range(10)])
+
+    async_to_sync(requests)()
+
+    # The time spent in inner middlewares is not part of the outer
+    # middleware, even when requests are served concurrently.
+    outer_duration = _get_middleware_duration(outer_name) - outer_before
+    inner_duration = _get_middleware_duration(inner_name) - inner_before
+
+    assert 10 * 0.01 <= outer_duration < 10 * 0.04
+    assert 10 * 0.05 <= inner_duration < 10 * 0.08
+
+
+class NoopMiddleware:
+    def __init__(self, get_response: Any) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        return self.get_response(request)
+
+
+def test_wrapped_middleware_not_sampled(settings: Any) -> None:
+    settings.METRICS_PYTHON_MIDDLEWARE_SAMPLE_RATE = 0.0
+
+    def view(request: HttpRequest) -> HttpResponse:
+        return HttpResponse()
+
+    outer_name = "tests.NotSampledOuterMiddleware"
+    inner_name = "tests.NotSampledInnerMiddleware"
+
+    inner = _wrap_middleware(NoopMiddleware, inner_name)(view)
+    outer = _wrap_middleware(NoopMiddleware, outer_name)(inner)
+
+    response = outer(RequestFactory().get("/"))
+
+    assert response.status_code == 200
+    assert _get_middleware_duration(outer_name) == 0.0
+    assert _get_middleware_duration(inner_name) == 0.0
+
+
+def _get_sample(name: str, labels: dict[str, str]) -> float:
+    return REGISTRY.get_sample_value(f"metrics_python_django_{name}", labels) or 0.0
+
+
+@pytest.mark.django_db
+def test_query_count_middleware_streaming_response() -> None:
+    def stream() -> Iterator[bytes]:
+        yield b"a" * 10
+        _execute_sql("SELECT 1")
+        yield b"b" * 5
+
+    def get_response(request: HttpRequest) -> HttpResponse:
+        _execute_sql("SELECT 1")
+        return cast(HttpResponse, StreamingHttpResponse(stream(), status=202))
+
+    labels = {"method": "GET", "view": "<unnamed view>", "status": "202"}
+    db_labels = {"db": "default", **labels}
+    before_queries = _get_view_query_count(db_labels)
+    before_stream_queries = _get_sample("view_stream_query_count_total", db_labels)
+    before_size = _get_sample("view_stream_size_bytes_total", labels)
+    before_streams = _get_sample("view_stream_duration_seconds_count", labels)
+
+    middleware = QueryCountMiddleware(get_response)
+    response = middleware(RequestFactory().get("/"))
+
+    # Nothing is measured before the stream is consumed and closed.
+    assert _get_view_query_count(db_labels) == before_queries
+
+    assert b"".join(response.streaming_content) == b"a" * 10 + b"b" * 5
+    response.close()
+    response.close()
+
+    assert _get_view_query_count(db_labels) - before_queries == 2.0
+    assert (
+        _get_sample("view_stream_query_count_total", db_labels) - before_stream_queries
+        == 1.0
+    )
+    assert _get_sample("view_stream_size_bytes_total", labels) - before_size == 15.0
+    assert (
+        _get_sample("view_stream_duration_seconds_count", labels) - before_streams
+        == 1.0
+    )
+    assert _get_sample("view_stream_time_to_first_byte_seconds_count", labels) >= 1.0
+
+
+@pytest.mark.django_db
+def test_query_count_middleware_streaming_response_finish(
+    settings: Any, mocker: MockerFixture, capsys: pytest.CaptureFixture[str]
+) -> None:
+    settings.METRICS_PYTHON_TRACK_TOP_STATEMENTS = True
+    settings.METRICS_PYTHON_PRINT_DUPLICATE_QUERIES = True
+
+    def stream() -> Iterator[bytes]:
+        for _ in range(3):
+            _execute_sql("SELECT 1")
+            yield b"a"
+
+    def get_response(request: HttpRequest) -> HttpResponse:
+        return cast(HttpResponse, StreamingHttpResponse(stream()))
+
+    track_top_statements = mocker.spy(QueryCounter, "track_top_statements")
+
+    middleware = QueryCountMiddleware(get_response)
+    response = middleware(RequestFactory().get("/"))
+
+    # Statements and duplicates are reported once the stream is consumed.
+    track_top_statements.assert_not_called()
+    assert "Duplicate queries detected!" not in capsys.readouterr().out
+
+    assert b"".join(response.streaming_content) == b"aaa"
+    response.close()
+
+    track_top_statements.assert_called_once()
+    assert "The above query was executed 3 times" in capsys.readouterr().out
+
+
+@pytest.mark.django_db(transaction=True)
+def test_query_count_middleware_async_streaming_response() -> None:
+    async def stream() -> AsyncIterator[bytes]:
+        yield b"a" * 3
+        await sync_to_async(_execute_sql)("SELECT 1")
+        yield b"b" * 4
+
+    async def get_response(request: HttpRequest) -> HttpResponse:
+        return cast(HttpResponse, StreamingHttpResponse(stream(), status=203))
+
+    async def consume(response: Any) -> bytes:
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        await sync_to_async(response.close)()
+        return content
+
+    labels = {"method": "GET", "view": "<unnamed view>", "status": "203"}
+    db_labels = {"db": "default", **labels}
+    before_stream_queries = _get_sample("view_stream_query_count_total", db_labels)
+    before_size = _get_sample("view_stream_size_bytes_total", labels)
+
+    middleware = QueryCountMiddleware(get_response)
+    response = async_to_sync(middleware)(RequestFactory().get("/"))
+
+    assert async_to_sync(consume)(response) == b"aaabbbb"
+    assert (
+        _get_sample("view_stream_query_count_total", db_labels) - before_stream_queries
+        == 1.0
+    )
+    assert _get_sample("view_stream_size_bytes_total", labels) - before_size == 7.0
+
+
+@pytest.mark.django_db
+def test_query_count_middleware_file_response() -> None:
+    def get_response(request: HttpRequest) -> HttpResponse:
+        return cast(HttpResponse, FileResponse(io.BytesIO(b"x" * 100), status=206))
+
+    labels = {"method": "GET", "view": "<unnamed view>", "status": "206"}
+    before_size = _get_sample("view_stream_size_bytes_total", labels)
+
+    middleware = QueryCountMiddleware(get_response)
+    response = middleware(RequestFactory().get("/"))
+
+    # The file is left to the server, so it can use wsgi.file_wrapper.
+    assert getattr(response, "file_to_stream", None) is not None
+    response.close()
+
+    assert _get_sample("view_stream_size_bytes_total", labels) - before_size == 100.0
@@ -0,0 +1,249 @@
+import time
+from typing import Any
+
+import pytest
+from prometheus_client import REGISTRY
+from pytest_mock import MockerFixture
+
+pytest.importorskip("psycopg")
+psycopg_pool = pytest.importorskip("psycopg_pool")
+
+from django.db.backends.postgresql import base as postgresql_base  # noqa: E402
+
+from metrics_python.django.postgres_engine.base import (  # noqa: E402
+    DatabaseWrapper,
+    PoolStatsCollector,
+)
+
+
+def _create_wrapper(alias: str) -> DatabaseWrapper:
+    return DatabaseWrapper(
+        {
+            "ENGINE": "metrics_python.django.postgres_engine",
+            "NAME": "metrics",
+            "USER": "metrics",
+            "PASSWORD": "",
+            "HOST": "localhost",
+            "PORT": "5432",
+            "OPTIONS": {},
+            "ATOMIC_REQUESTS": False,
+            "AUTOCOMMIT": True,
+            "CONN_MAX_AGE": 0,
+            "CONN_HEALTH_CHECKS": False,
+            "TIME_ZONE": None,
+            "TEST": {},
+        },
+        alias,
+    )
+
+
+def _get_sample(name: str, alias: str, **labels: str) -> float:
+    return (
+        REGISTRY.get_sample_value(
+            f"metrics_python_django_{name}", {"db": alias, **labels}
+        )
+        or 0.0
+    )
+
+
+@pytest.fixture
+def pool(mocker: MockerFixture) -> Any:
+    pool = mocker.Mock()
+    mocker.patch.object(
+        postgresql_base.DatabaseWrapper,
+        "pool",
+        new_callable=mocker.PropertyMock,
+        return_value=pool,
+    )
+    return pool
+
+
+def test_pool_checkout(mocker: MockerFixture, pool: Any) -> None:
+    connection = mocker.Mock()
+    mocker.patch.object(
+        postgresql_base.DatabaseWrapper, "get_new_connection", return_value=connection
+    )
+
+    wrapper = _create_wrapper("pool_checkout")
+    assert wrapper.get_new_connection({}) is connection
+
+    assert (
+        _get_sample("database_pool_checkout_duration_seconds_count", "pool_checkout")
+        == 1.0
+    )
+    assert (
+        _get_sample("database_pool_checkout_timeout_count_total", "pool_checkout") == 0
+    )
+
+
+def test_pool_checkout_timeout(mocker: MockerFixture, pool: Any) -> None:
+    mocker.patch.object(
+        postgresql_base.DatabaseWrapper,
+        "get_new_connection",
+        side_effect=psycopg_pool.PoolTimeout(),
+    )
+
+    wrapper = _create_wrapper("pool_timeout")
+    with pytest.raises(psycopg_pool.PoolTimeout):
+        wrapper.get_new_connection({})
+
+    assert (
+        _get_sample("database_pool_checkout_duration_seconds_count", "pool_timeout")
+        == 1.0
+    )
+    assert (
+        _get_sample("database_pool_checkout_timeout_count_total", "pool_timeout") == 1
+    )
+
+
+def test_connection_reuse(mocker: MockerFixture) -> None:
+    def connect(self: Any) -> None:
+        self.connection = mocker.Mock()
+
+    mocker.patch.object(postgresql_base.DatabaseWrapper, "connect", connect)
+    mocker.patch.object(postgresql_base.DatabaseWrapper, "ensure_connection")
+    mocker.patch.object(
+        postgresql_base.DatabaseWrapper, "close_if_unusable_or_obsolete"
+    )
+
+    wrapper = _create_wrapper("reuse")
+
+    # A new connection is opened, using it again in the same request is not
+    # counted as reuse.
+    wrapper.connect()
+    wrapper.ensure_connection()
+
+    # The connection is kept open across the request boundary and reused.
+    wrapper.close_if_unusable_or_obsolete()
+    wrapper.ensure_connection()
+    wrapper.ensure_connection()
+
+    assert (
+        _get_sample("database_connection_reuse_count_total", "reuse", reused="false")
+        == 1
+    )
+    assert (
+        _get_sample("database_connection_reuse_count_total", "reuse", reused="true")
+        == 1
+    )
+
+
+def test_connection_age(mocker: MockerFixture) -> None:
+    mocker.patch.object(postgresql_base.DatabaseWrapper, "close")
+
+    wrapper = _create_wrapper("age")
+    wrapper.connection = mocker.Mock()
+    wrapper._metrics_python_connected_at = time.monotonic() - 10
+
+    wrapper.close()
+    # Closing a closed connection is not observed.
+    wrapper.close()
+
+    assert _get_sample("database_connection_age_seconds_count", "age") == 1.0
+    assert _get_sample("database_connection_age_seconds_sum", "age") >= 10
+
+
+def test_pool_stats_collector(mocker: MockerFixture) -> None:
+    pool = mocker.Mock()
+    pool.get_stats.return_value = {
+        "pool_size": 10,
+        "pool_available": 4,
+        "requests_waiting": 2,
+    }
+    mocker.patch.object(
+        postgresql_base.DatabaseWrapper,
+        "_connection_pools",
+        {"stats": pool},
+        create=True,
+    )
+
+    samples = {
+        sample.name: sample.value
+        for metric in PoolStatsCollector().collect()
+        for sample in metric.samples
+        if sample.labels == {"db": "stats"}
+    }
+
+    assert samples == {
+        "metrics_python_django_database_pool_size": 10,
+        "metrics_python_django_database_pool_idle": 4,
+        "metrics_python_django_database_pool_in_use": 6,
+        "metrics_python_django_database_pool_requests_waiting": 2,
+    }
+
+
+@pytest.mark.parametrize(
+    "alias,is_usable,failures",
+    [
+        ("health_usable", {"return_value": True}, 0),
+        ("health_unusable", {"return_value": False}, 1),
+        ("health_error", {"side_effect": RuntimeError("connection lost")}, 1),
+    ],
+)
+def test_health_check(
+    mocker: MockerFixture, alias: str, is_usable: dict[str, Any], failures: int
+) -> None:
+    mocker.patch.object(postgresql_base.DatabaseWrapper, "is_usable", **is_usable)
+
+    wrapper = _create_wrapper(alias)
+
+    if "side_effect" in is_usable:
+        with pytest.raises(RuntimeError):
+            wrapper.is_usable()
+    else:
+        assert wrapper.is_usable() is is_usable["return_value"]
+
+    assert _get_sample("database_health_check_duration_seconds_count", alias) == 1.0
+    assert _get_sample("database_health_check_failure_count_total", alias) == failures
+
+
+@pytest.mark.parametrize(
+    "alias,closed,reconnects",
+    [("health_check_passed", False, 0), ("health_check_failed", True, 1)],
+)
+def test_forced_reconnect(
+    mocker: MockerFixture, alias: str, closed: bool, reconnects: int
+) -> None:
+    def close_if_health_check_failed(self: Any) -> None:
+        if closed:
+            self.connection = None
+
+    mocker.patch.object(
+        postgresql_base.DatabaseWrapper,
+        "close_if_health_check_failed",
+        close_if_health_check_failed,
+    )
+
+    wrapper = _create_wrapper(alias)
+    wrapper.connection = mocker.Mock()
+    wrapper.close_if_health_check_failed()
+
+    # A closed connection is not reconnected by the health check.
+    wrapper.close_if_health_check_failed()
+
+    assert _get_sample("database_forced_reconnect_count_total", alias) == reconnects
+
+
+def test_connection_metrics_resolved_once(mocker: MockerFixture) -> None:
+    wrapper = _create_wrapper("label_children")
+    get_connection_params = mocker.spy(wrapper, "get_connection_params")
+
+    assert wrapper._metrics_python_metrics is wrapper._metrics_python_metrics
+    assert get_connection_params.call_count == 1
+
+
+def test_connection_metrics_settings_changed(mocker: MockerFixture) -> None:
+    mocker.patch.object(postgresql_base.DatabaseWrapper, "connect")
+
+    wrapper = _create_wrapper("label_children_renamed")
+    metrics = wrapper._metrics_python_metrics
+
+    wrapper.connect()
+    assert wrapper._metrics_python_metrics is metrics
+
+    # The test runner renames the database of the wrapper.
+    wrapper.settings_dict["NAME"] = "test_metrics"
+    wrapper.connect()
+
+    assert wrapper._metrics_python_metrics is not metrics
+    assert wrapper.get_connection_params()["dbname"] == "test_metrics"
@@ -0,0 +1,327 @@
+import threading
+from types import CodeType
+from typing import Any
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.db import connections
+from django.db.backends.utils import CursorWrapper
+from django.template import Context, Engine
+from django.test import AsyncClient, Client
+from prometheus_client import REGISTRY
+from pytest_mock import MockerFixture
+
+from metrics_python.django._query_counter import QueryCounter, _patch_cursor_wrapper
+from metrics_python.django._sql import get_sql_statement
+from metrics_python.django.middleware import patch_middlewares
+
+
+class FakeConnection:
+    def __init__(self, alias: str = "default") -> None:
+        self.alias = alias
+
+
+def _execute(sql: Any, params: Any, many: Any, context: Any) -> None:
+    return None
+
+
+def _query(
+    counter: QueryCounter, sql: str, params: Any = None, alias: str = "default"
+) -> None:
+    counter(_execute, sql, params, False, {"connection": FakeConnection(alias)})
+
+
+def test_query_counter_counts_queries() -> None:
+    counter = QueryCounter()
+
+    _query(counter, "SELECT 1")
+    _query(counter, "SELECT 2", alias="other")
+
+    assert counter.get_total_query_count() == 2
+    assert counter.get_total_query_count_by_alias() == {"default": 1, "other": 1}
+
+
+def test_query_counter_detects_duplicates_from_same_call_site() -> None:
+    counter = QueryCounter()
+
+    for _ in range(3):
+        _query(counter, "SELECT 1")
+
+    assert counter.get_total_duplicate_query_count() == 2
+    assert counter.get_total_duplicate_query_count_by_alias() == {"default": 2}
+
+
+def test_query_counter_ignores_same_sql_from_different_call_sites() -> None:
+    counter = QueryCounter()
+
+    _query(counter, "SELECT 1")
+    _query(counter, "SELECT 1")
+
+    assert counter.get_total_duplicate_query_count() == 0
+
+
+def test_query_counter_ignores_different_sql_from_same_call_site() -> None:
+    counter = QueryCounter()
+
+    for table in ["a", "b", "c"]:
+        _query(counter, f"SELECT * FROM {table}")
+
+    assert counter.get_total_duplicate_query_count() == 0
+
+
+def test_query_counter_detects_duplicates_by_sql_fingerprint() -> None:
+    counter = QueryCounter()
+
+    for i in range(1, 4):
+        placeholders = ", ".join(["%s"] * i)
+        _query(counter, f"SELECT * FROM a WHERE id IN ({placeholders})")
+
+    assert counter.get_total_duplicate_query_count() == 2
+
+
+def test_query_counter_detects_n_plus_one_queries(settings: Any) -> None:
+    settings.METRICS_PYTHON_N_PLUS_ONE_THRESHOLD = 5
+    counter = QueryCounter()
+
+    for i in range(10):
+        _query(counter, "SELECT * FROM a WHERE id = %s", [i])
+
+    for i in range(5):
+        _query(counter, "SELECT * FROM b WHERE id = %s", [i])
+
+    assert counter.get_n_plus_one_loop_sizes_by_alias() == {"default": [10]}
+    assert counter.get_estimated_n_plus_one_count_by_alias() == {"default": 1.0}
+
+
+def test_query_counter_ignores_n_plus_one_with_same_params(settings: Any) -> None:
+    settings.METRICS_PYTHON_N_PLUS_ONE_THRESHOLD = 5
+    counter = QueryCounter()
+
+    for _ in range(10):
+        _query(counter, "SELECT * FROM a WHERE id = %s", [1])
+
+    assert counter.get_total_duplicate_query_count() == 9
+    assert counter.get_n_plus_one_loop_sizes_by_alias() == {}
+
+
+def test_query_counter_observes_table_queries(settings: Any) -> None:
+    settings.METRICS_PYTHON_OBSERVE_TABLE_QUERIES = True
+    counter = QueryCounter()
+
+    _query(counter, 'SELECT * FROM "a" WHERE id = %s', [1])
+    _query(counter, 'SELECT * FROM "a" WHERE id = %s', [2])
+    _query(counter, 'UPDATE "a" SET b = %s', [1], alias="other")
+
+    assert counter.get_table_query_count() == {
+        ("default", "a", "select"): 2,
+        ("other", "a", "update"): 1,
+    }
+    assert set(counter.get_table_query_duration_seconds()) == {
+        ("default", "a", "select"),
+        ("other", "a", "update"),
+    }
+
+
+def test_query_counter_does_not_keep_frames() -> None:
+    counter = QueryCounter()
+
+    _query(counter, "SELECT 1")
+
+    ((call_site, fingerprint),) = counter.call_sites
+    assert fingerprint == get_sql_statement("SELECT 1").fingerprint
+    assert all(isinstance(code, CodeType) for code, _, _ in call_site)
+
+
+def test_query_counter_bounds_call_sites(settings: Any) -> None:
+    settings.METRICS_PYTHON_DUPLICATE_QUERIES_MAX_CALL_SITES = 2
+    counter = QueryCounter()
+
+    for table in ["a", "b", "c", "d", "e"]:
+        _query(counter, f"SELECT * FROM {table}")
+
+    assert len(counter.call_sites) == 2
+
+
+def test_query_counter_prints_template_location(
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    counter = QueryCounter()
+    template = Engine().from_string(
+        "{% for i in items %}\n{{ execute_query }}\n{% endfor %}"
+    )
+    template.render(
+        Context(
+            {
+                "items": range(3),
+                "execute_query": lambda: _query(counter, "SELECT 1"),
+            }
+        )
+    )
+
+    assert counter.get_total_duplicate_query_count() == 2
+
+    counter.print_duplicate_queries()
+    output = capsys.readouterr().out
+
+    assert 'File "<unknown source>", line 2' in output
+    assert "execute_query" in output
+    assert "The above query was executed 3 times" in output
+
+
+def test_query_counter_duplicate_queries_not_sampled() -> None:
+    counter = QueryCounter(duplicate_queries_sample_rate=0.0)
+
+    for _ in range(3):
+        _query(counter, "SELECT 1")
+
+    # Query counts are exact, even if duplicates are not observed.
+    assert counter.get_total_query_count() == 3
+    assert counter.get_total_duplicate_query_count() == 0
+    assert counter.get_estimated_duplicate_query_count_by_alias() == {}
+
+
+def test_query_counter_duplicate_queries_sampled(mocker: MockerFixture) -> None:
+    mocker.patch("random.random", return_value=0.1)
+    counter = QueryCounter(duplicate_queries_sample_rate=0.25)
+
+    for _ in range(3):
+        _query(counter, "SELECT 1")
+
+    assert counter.get_total_duplicate_query_count() == 2
+    assert counter.get_estimated_duplicate_query_count_by_alias() == {"default": 8.0}
+
+
+def test_query_counter_set_duplicate_queries_sample_rate(
+    mocker: MockerFixture,
+) -> None:
+    counter = QueryCounter(duplicate_queries_sample_rate=1.0)
+
+    for _ in range(3):
+        _query(counter, "SELECT 1")
+
+    # Duplicates observed before the counter is no longer sampled are dropped.
+    counter.set_duplicate_queries_sample_rate(0.0)
+    _query(counter, "SELECT 1")
+
+    assert counter.observe_duplicate_queries is False
+    assert counter.get_total_duplicate_query_count() == 0
+
+    mocker.patch("random.random", return_value=0.1)
+    counter.set_duplicate_queries_sample_rate(0.5)
+
+    for _ in range(3):
+        _query(counter, "SELECT 1")
+
+    assert counter.get_total_duplicate_query_count() == 2
+    assert counter.get_estimated_duplicate_query_count_by_alias() == {"default": 4.0}
+
+
+@pytest.mark.parametrize("client_class", [Client, AsyncClient])
+def test_duplicate_queries_view_sample_rate(
+    settings: Any, mocker: MockerFixture, client_class: type[Client | AsyncClient]
+) -> None:
+    settings.MIDDLEWARE = ["metrics_python.django.middleware.QueryCountMiddleware"]
+    settings.METRICS_PYTHON_DUPLICATE_QUERIES_SAMPLE_RATE = 0.5
+    settings.METRICS_PYTHON_DUPLICATE_QUERIES_VIEW_SAMPLE_RATES = {"index": 0.1}
+
+    set_sample_rate = mocker.spy(QueryCounter, "set_duplicate_queries_sample_rate")
+
+    client = client_class()
+    get = async_to_sync(client.get) if isinstance(client, AsyncClient) else client.get
+
+    assert get("/").status_code == 200
+    assert get("/unknown/").status_code == 404
+
+    # The rate of the view is applied once the handler has resolved the
+    # view, requests not matching a view keep the default rate.
+    set_sample_rate.assert_called_once_with(mocker.ANY, 0.1)
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize("client_class", [Client, AsyncClient])
+def test_duplicate_queries_view_sample_rate_patched_middlewares(
+    settings: Any, client_class: type[Client | AsyncClient]
+) -> None:
+    patch_middlewares()
+
+    settings.MIDDLEWARE = ["metrics_python.django.middleware.QueryCountMiddleware"]
+    settings.METRICS_PYTHON_DUPLICATE_QUERIES_SAMPLE_RATE = 0.0
+    settings.METRICS_PYTHON_DUPLICATE_QUERIES_VIEW_SAMPLE_RATES = {"duplicates": 1.0}
+
+    labels = {"db": "default", "method": "GET", "view": "duplicates", "status": "200"}
+
+    def get_duplicate_count() -> float:
+        return (
+            REGISTRY.get_sample_value(
+                "metrics_python_django_view_duplicate_query_count_total", labels
+            )
+            or 0.0
+        )
+
+    before = get_duplicate_count()
+
+    client = client_class()
+    get = async_to_sync(client.get) if isinstance(client, AsyncClient) else client.get
+    assert get("/duplicates/").status_code == 200
+
+    # The process_view hook of the query counter middleware is kept when
+    # the middleware is wrapped.
+    assert get_duplicate_count() - before == 2.0
+
+
+def _execute_sql(alias: str, sql: str) -> None:
+    with connections[alias].cursor() as cursor:
+        cursor.execute(sql)
+
+
+@pytest.mark.django_db(databases=["default", "other"])
+def test_create_counter_observes_queries() -> None:
+    with QueryCounter.create_counter() as counter:
+        _execute_sql("default", "SELECT 1")
+        _execute_sql("default", "SELECT 2")
+
+    # Queries executed when no counter is active are not observed.
+    _execute_sql("other", "SELECT 1")
+
+    assert counter.get_total_query_count_by_alias() == {"default": 2}
+
+    with QueryCounter.create_counter() as counter:
+        _execute_sql("other", "SELECT 1")
+
+    assert counter.get_total_query_count_by_alias() == {"other": 1}
+
+
+@pytest.mark.django_db
+def test_create_counter_nested() -> None:
+    with QueryCounter.create_counter() as outer:
+        _execute_sql("default", "SELECT 1")
+
+        with QueryCounter.create_counter() as inner:
+            _execute_sql("default", "SELECT 2")
+
+    assert outer.get_total_query_count() == 2
+    assert inner.get_total_query_count() == 1
+
+
+def test_patch_cursor_wrapper_concurrently(mocker: MockerFixture) -> None:
+    class FreshCursorWrapper(CursorWrapper):
+        pass
+
+    mocker.patch("django.db.backends.utils.CursorWrapper", FreshCursorWrapper)
+
+    original_execute_with_wrappers = CursorWrapper._execute_with_wrappers
+    barrier = threading.Barrier(8)
+
+    def patch() -> None:
+        barrier.wait()
+        _patch_cursor_wrapper()
+
+    threads = [threading.Thread(target=patch) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # The cursor wrapper is wrapped once by the first counter created.
+    patched = FreshCursorWrapper.__dict__["_execute_with_wrappers"]
+    assert patched.__wrapped__ is original_execute_with_wrappers
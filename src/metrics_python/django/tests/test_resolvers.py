@@ -0,0 +1,46 @@
+from django.test import Client
+from prometheus_client import REGISTRY
+from pytest_mock import MockerFixture
+
+from metrics_python.django import resolvers
+from metrics_python.django._metrics import URL_RESOLVE_DURATION
+from metrics_python.django.resolvers import patch_url_resolvers
+
+
+def _get_resolve_count(view: str) -> float:
+    return (
+        REGISTRY.get_sample_value(
+            "metrics_python_django_url_resolve_duration_seconds_count",
+            {"view": view},
+        )
+        or 0.0
+    )
+
+
+def test_patch_url_resolvers() -> None:
+    patch_url_resolvers()
+    patch_url_resolvers()
+
+    before_index = _get_resolve_count("index")
+    before_unresolved = _get_resolve_count("<unnamed view>")
+
+    client = Client()
+    assert client.get("/").status_code == 200
+    assert client.get("/missing/").status_code == 404
+
+    assert _get_resolve_count("index") - before_index == 1.0
+    assert _get_resolve_count("<unnamed view>") - before_unresolved == 1.0
+
+
+def test_patch_url_resolvers_label_children(mocker: MockerFixture) -> None:
+    patch_url_resolvers()
+
+    mocker.patch.dict(resolvers._resolve_durations, clear=True)
+    labels = mocker.spy(URL_RESOLVE_DURATION, "labels")
+
+    client = Client()
+    for _ in range(3):
+        assert client.get("/").status_code == 200
+
+    # The label child of a view is resolved once.
+    labels.assert_called_once_with(view="index")
@@ -0,0 +1,109 @@
+from typing import Any
+
+import pytest
+from django.db import connections
+from prometheus_client import REGISTRY
+from pytest_mock import MockerFixture
+
+from metrics_python.django._query_counter import QueryCounter
+from metrics_python.django._sql import get_sql_statement
+from metrics_python.django.slow_queries import explain_query, get_slow_query_plans
+
+
+def _execute_sql(sql: str) -> None:
+    with connections["default"].cursor() as cursor:
+        cursor.execute(sql)
+
+
+@pytest.mark.django_db
+def test_query_duration_exemplar(settings: Any) -> None:
+    settings.METRICS_PYTHON_OBSERVE_QUERY_DURATION = True
+
+    with QueryCounter.create_counter(get_name=lambda: "view", trace_id="abc"):
+        _execute_sql("SELECT 42")
+
+    exemplars = [
+        sample.exemplar
+        for metric in REGISTRY.collect()
+        if metric.name == "metrics_python_django_query_duration_seconds"
+        for sample in metric.samples
+        if sample.exemplar
+    ]
+
+    assert any(
+        exemplar.labels
+        == {
+            "statement": get_sql_statement("SELECT 42").fingerprint,
+            "trace_id": "abc",
+            "view": "view",
+        }
+        for exemplar in exemplars
+    )
+
+
+@pytest.mark.django_db
+def test_explain_slow_queries(settings: Any) -> None:
+    settings.METRICS_PYTHON_EXPLAIN_SLOW_QUERIES = True
+    settings.METRICS_PYTHON_SLOW_QUERY_THRESHOLD = 0.0
+    settings.METRICS_PYTHON_EXPLAIN_SAMPLE_RATE = 1.0
+
+    with QueryCounter.create_counter(get_name=lambda: "view") as counter:
+        _execute_sql("SELECT 1")
+        _execute_sql("CREATE TEMPORARY TABLE slow_query_test (id integer)")
+
+    # The EXPLAIN queries are not observed by the counter.
+    assert counter.get_total_query_count() == 2
+
+    plan = get_slow_query_plans()[-1]
+
+    assert plan.db == "default"
+    assert plan.name == "view"
+    assert plan.sql == "SELECT 1"
+    assert plan.plan
+
+
+class ComposedSQL:
+    """
+    A composed SQL object, rendered to a string by the database driver.
+    """
+
+    def __str__(self) -> str:
+        return "SELECT 1"
+
+
+@pytest.mark.parametrize(
+    "sql,savepoint",
+    [
+        (ComposedSQL(), {}),
+        ("SELECT 1", {"side_effect": RuntimeError("savepoint failed")}),
+        ("SELECT 1", {"return_value": "s1"}),
+    ],
+)
+def test_explain_query_errors(
+    settings: Any, mocker: MockerFixture, sql: Any, savepoint: dict[str, Any]
+) -> None:
+    settings.METRICS_PYTHON_EXPLAIN_SAMPLE_RATE = 1.0
+
+    connection = mocker.Mock()
+    connection.savepoint = mocker.Mock(**savepoint)
+    connection.cursor.side_effect = RuntimeError("cursor failed")
+
+    plans_before = len(get_slow_query_plans())
+
+    # Errors capturing the plan are not raised to the caller of the query.
+    explain_query(
+        connection=connection,
+        sql=sql,
+        params=None,
+        duration_seconds=1.0,
+        name="view",
+        trace_id=None,
+    )
+
+    assert len(get_slow_query_plans()) == plans_before
+
+    if isinstance(sql, ComposedSQL):
+        connection.savepoint.assert_not_called()
+
+    if savepoint.get("return_value"):
+        connection.savepoint_rollback.assert_called_once_with("s1")
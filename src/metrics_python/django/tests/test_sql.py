@@ -0,0 +1,67 @@
+import pytest
+
+from metrics_python.django._sql import (
+    get_sql_statement,
+    get_statement_kind_and_table,
+    normalize_sql,
+)
+
+
+@pytest.mark.parametrize(
+    "sql,expected_result",
+    [
+        ("SELECT 1", "SELECT ?"),
+        (
+            'SELECT "a"."id" FROM "a" WHERE "a"."id" = %s LIMIT 21',
+            'SELECT "a"."id" FROM "a" WHERE "a"."id" = ? LIMIT ?',
+        ),
+        (
+            "SELECT * FROM a WHERE name = 'it''s' AND price > 1.5",
+            "SELECT * FROM a WHERE name = ? AND price > ?",
+        ),
+        (
+            "SELECT * FROM a WHERE id IN (%s, %s,\n %s)",
+            "SELECT * FROM a WHERE id IN (...)",
+        ),
+        (
+            "INSERT INTO a (b, c) VALUES (%s, %s), (%s, %s), (%s, %s)",
+            "INSERT INTO a (b, c) VALUES (?, ?), ...",
+        ),
+        ("SELECT * FROM t1 WHERE id = $1", "SELECT * FROM t1 WHERE id = ?"),
+        ("SELECT * FROM a WHERE id = %(id)s", "SELECT * FROM a WHERE id = ?"),
+    ],
+)
+def test_normalize_sql(sql: str, expected_result: str) -> None:
+    assert normalize_sql(sql) == expected_result
+
+
+def test_get_sql_statement_fingerprint() -> None:
+    assert (
+        get_sql_statement("SELECT * FROM a WHERE id IN (%s)").fingerprint
+        == get_sql_statement("SELECT * FROM a WHERE id IN (%s, %s)").fingerprint
+    )
+    assert (
+        get_sql_statement("SELECT * FROM a").fingerprint
+        != get_sql_statement("SELECT * FROM b").fingerprint
+    )
+
+
+@pytest.mark.parametrize(
+    "sql,expected_result",
+    [
+        (
+            'SELECT "a"."id" FROM "app_author" WHERE "a"."id" = ?',
+            ("select", "app_author"),
+        ),
+        ("SELECT * FROM (SELECT * FROM b) AS sub", ("select", "b")),
+        ('INSERT INTO "public"."a" (b) VALUES (?)', ("insert", "public.a")),
+        ('UPDATE "a" SET "b" = ? WHERE "a"."id" = ?', ("update", "a")),
+        ("DELETE FROM a WHERE id IN (...)", ("delete", "a")),
+        ("SELECT ?", ("select", "<unknown>")),
+        ('SAVEPOINT "s1"', ("other", "<unknown>")),
+    ],
+)
+def test_get_statement_kind_and_table(
+    sql: str, expected_result: tuple[str, str]
+) -> None:
+    assert get_statement_kind_and_table(sql) == expected_result
@@ -0,0 +1,81 @@
+from typing import Any
+
+from prometheus_client import CollectorRegistry
+
+from metrics_python.django._query_counter import QueryCounter
+from metrics_python.django.statements import (
+    TOP_STATEMENTS,
+    SpaceSaving,
+    TopStatementsCollector,
+)
+
+
+class FakeConnection:
+    alias = "default"
+
+
+def _execute(sql: Any, params: Any, many: Any, context: Any) -> None:
+    return None
+
+
+def test_space_saving_keeps_heaviest_statements() -> None:
+    top_statements = SpaceSaving(capacity=2)
+
+    top_statements.add(
+        db="default", fingerprint="a", statement="A", count=1, duration_seconds=3.0
+    )
+    top_statements.add(
+        db="default", fingerprint="b", statement="B", count=1, duration_seconds=1.0
+    )
+    top_statements.add(
+        db="default", fingerprint="a", statement="A", count=1, duration_seconds=1.0
+    )
+
+    # The table is full, c replaces b which has the least database time.
+    top_statements.add(
+        db="default", fingerprint="c", statement="C", count=1, duration_seconds=0.5
+    )
+
+    entries = top_statements.top()
+
+    assert [entry.fingerprint for entry in entries] == ["a", "c"]
+    assert entries[0].count == 2
+    assert entries[0].duration_seconds == 4.0
+    assert entries[0].error_seconds == 0.0
+    assert entries[1].duration_seconds == 1.5
+    assert entries[1].error_seconds == 1.0
+
+
+def test_query_counter_tracks_top_statements(settings: Any) -> None:
+    settings.METRICS_PYTHON_TRACK_TOP_STATEMENTS = True
+
+    with QueryCounter.create_counter() as counter:
+        for i in range(3):
+            counter(
+                _execute,
+                f"SELECT * FROM top_statements WHERE id = {i}",
+                None,
+                False,
+                {"connection": FakeConnection()},
+            )
+
+    registry = CollectorRegistry()
+    registry.register(TopStatementsCollector())
+
+    (entry,) = [
+        entry
+        for entry in TOP_STATEMENTS.top()
+        if entry.statement == "SELECT * FROM top_statements WHERE id = ?"
+    ]
+
+    assert (
+        registry.get_sample_value(
+            "metrics_python_django_top_statement_count_total",
+            {
+                "db": "default",
+                "fingerprint": entry.fingerprint,
+                "statement": entry.statement,
+            },
+        )
+        == 3.0
+    )
@@ -0,0 +1,100 @@
+import time
+
+import pytest
+from django.db import connection, transaction
+
+from metrics_python.django._query_counter import QueryCounter
+from metrics_python.django.transactions import patch_transactions
+
+
+class RollbackError(Exception):
+    pass
+
+
+def _execute_sql(sql: str) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_patch_transactions() -> None:
+    patch_transactions()
+
+    with QueryCounter.create_counter() as counter:
+        with transaction.atomic():
+            _execute_sql("SELECT 1")
+
+            with pytest.raises(RollbackError):
+                with transaction.atomic():
+                    _execute_sql("SELECT 2")
+                    raise RollbackError()
+
+            # Nested blocks without a savepoint are part of the transaction.
+            with transaction.atomic(savepoint=False):
+                _execute_sql("SELECT 3")
+
+    assert counter.get_transaction_count() == {
+        ("default", "transaction", "commit"): 1,
+        ("default", "savepoint", "rollback"): 1,
+    }
+    durations = counter.get_transaction_duration_seconds()
+    max_durations = counter.get_transaction_max_duration_seconds()
+    assert durations.keys() == {("default", "transaction"), ("default", "savepoint")}
+    assert max_durations == durations
+
+
+@pytest.mark.django_db(transaction=True)
+def test_patch_transactions_idle_duration() -> None:
+    patch_transactions()
+
+    with QueryCounter.create_counter() as counter:
+        with transaction.atomic():
+            _execute_sql("SELECT 1")
+            time.sleep(0.05)
+
+    (idle_duration,) = counter.get_transaction_idle_duration_seconds().values()
+    assert idle_duration >= 0.05
+
+
+@pytest.mark.django_db(transaction=True)
+def test_patch_transactions_aggregates() -> None:
+    patch_transactions()
+
+    with QueryCounter.create_counter() as counter:
+        with transaction.atomic():
+            time.sleep(0.02)
+
+        for _ in range(100):
+            with transaction.atomic():
+                pass
+
+    key = ("default", "transaction")
+    assert counter.get_transaction_count() == {
+        ("default", "transaction", "commit"): 101
+    }
+
+    # Transactions are aggregated, the counter doesn't grow with the number
+    # of transactions.
+    assert counter.transaction_duration.keys() == {key}
+    assert counter.get_transaction_max_duration_seconds()[key] >= 0.02
+    assert (
+        counter.get_transaction_duration_seconds()[key]
+        >= counter.get_transaction_max_duration_seconds()[key]
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_patch_transactions_nested_counters() -> None:
+    patch_transactions()
+
+    with QueryCounter.create_counter() as outer:
+        with QueryCounter.create_counter() as inner:
+            with transaction.atomic():
+                _execute_sql("SELECT 1")
+
+        with transaction.atomic():
+            pass
+
+    # Transactions are observed by every active counter.
+    assert inner.get_transaction_count() == {("default", "transaction", "commit"): 1}
+    assert outer.get_transaction_count() == {("default", "transaction", "commit"): 2}
@@ -0,0 +1,131 @@
+import time
+from functools import wraps
+from typing import Any, NamedTuple
+
+from ._query_counter import QueryCounter, _active_counter
+
+
+class _AtomicBlock(NamedTuple):
+    # "transaction" or "savepoint".
+    kind: str
+    counter: QueryCounter
+    start: int
+    # Query duration of the counter on the alias when the block was entered,
+    # used to calculate the time spent idle in the transaction.
+    query_duration_at_start: int
+
+
+def _get_atomic_blocks(connection: Any) -> list[_AtomicBlock | None]:
+    # Atomic instances are reused when atomic is used as a decorator, the
+    # state of the open blocks is kept on the connection instead.
+    blocks: list[_AtomicBlock | None] | None = getattr(
+        connection, "_metrics_python_atomic_blocks", None
+    )
+    if blocks is None:
+        blocks = []
+        connection._metrics_python_atomic_blocks = blocks
+
+    return blocks
+
+
+def _start_atomic_block(
+    connection: Any, starts_transaction: bool
+) -> _AtomicBlock | None:
+    counter = _active_counter.get()
+    if counter is None:
+        return None
+
+    if starts_transaction:
+        kind = "transaction"
+    elif connection.savepoint_ids and connection.savepoint_ids[-1]:
+        kind = "savepoint"
+    else:
+        # Atomic blocks nested without a savepoint are part of the
+        # enclosing block.
+        return None
+
+    return _AtomicBlock(
+        kind=kind,
+        counter=counter,
+        start=time.perf_counter_ns(),
+        query_duration_at_start=counter.duration_count[connection.alias],
+    )
+
+
+def _get_idle_duration(connection: Any, block: _AtomicBlock) -> int | None:
+    """
+    Return the time spent in the transaction without executing queries.
+    This is measured before the commit, the commit itself is not idle time.
+    """
+
+    if block.kind != "transaction":
+        return None
+
+    query_duration = (
+        block.counter.duration_count[connection.alias] - block.query_duration_at_start
+    )
+
+    return max(time.perf_counter_ns() - block.start - query_duration, 0)
+
+
+def patch_transactions() -> None:
+    """
+    Patch atomic blocks to observe the number of transactions and
+    savepoints, their duration and the time spent idle in transactions.
+    Transactions are attributed to the active query counter, opened by the
+    QueryCountMiddleware, Celery tasks and management commands.
+    """
+
+    from django.db.transaction import Atomic, get_connection
+
+    if hasattr(Atomic, "_metrics_python_is_patched"):
+        return
+
+    old_enter = Atomic.__enter__
+    old_exit = Atomic.__exit__
+
+    @wraps(old_enter)
+    def __enter__(self: Atomic) -> None:
+        connection = get_connection(self.using)
+        starts_transaction = (
+            not connection.in_atomic_block and connection.get_autocommit()
+        )
+
+        old_enter(self)
+
+        block = _start_atomic_block(connection, starts_transaction)
+        _get_atomic_blocks(connection).append(block)
+
+    @wraps(old_exit)
+    def __exit__(self: Atomic, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        connection = get_connection(self.using)
+        blocks = _get_atomic_blocks(connection)
+        block = blocks.pop() if blocks else None
+
+        if block is None:
+            old_exit(self, exc_type, exc_value, traceback)
+            return
+
+        idle = _get_idle_duration(connection, block)
+
+        outcome = "rollback"
+        if exc_type is None and not connection.needs_rollback:
+            outcome = "commit"
+
+        try:
+            old_exit(self, exc_type, exc_value, traceback)
+        except Exception:
+            outcome = "rollback"
+            raise
+        finally:
+            block.counter.observe_transaction(
+                alias=connection.alias,
+                kind=block.kind,
+                outcome=outcome,
+                duration=time.perf_counter_ns() - block.start,
+                idle=idle,
+            )
+
+    Atomic.__enter__ = __enter__
+    Atomic.__exit__ = __exit__
+    Atomic._metrics_python_is_patched = True
@@ -1,8 +1,9 @@
 import time
-from typing import Any, Callable
+from typing import Any, Callable, cast
 
-from django.http import HttpRequest, HttpResponse
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
 
+from ..django._streaming import wrap_streaming_response
 from ..django._utils import get_request_method, get_view_name
 from ._metrics import VIEW_DURATION
 
@@ -18,9 +19,10 @@ class DjangoAPIDecoratorMetricsMiddleware:
 
         response = self.get_response(request)
 
-        if getattr(request, API_DECORATOR_VIEW, False):
-            view_duration = time.perf_counter() - view_start
+        if not getattr(request, API_DECORATOR_VIEW, False):
+            return response
 
+        def observe(view_duration: float) -> None:
             method = get_request_method(request)
             view = get_view_name(request)
             status = str(response.status_code)
@@ -29,6 +31,17 @@ class DjangoAPIDecoratorMetricsMiddleware:
                 view_duration
             )
 
+        if response.streaming:
+            # Streaming responses are observed when the stream is closed.
+            wrap_streaming_response(
+                cast(StreamingHttpResponse, response),
+                start=view_start,
+                counter=None,
+                on_close=lambda stats: observe(stats.duration),
+            )
+        else:
+            observe(time.perf_counter() - view_start)
+
         return response
 
     def process_view(